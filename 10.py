@@ -4,6 +4,7 @@ import uuid
 import heapq
 import threading
 import random
+from collections import deque
 from flask import Flask, request, jsonify, render_template_string
 from flask_socketio import SocketIO
 
@@ -59,6 +60,9 @@ GRAPH = {
 
 PARKING_NODES = ['81','82','83','84','85','86','11','12','13','15','26','31','46','51','56']
 MAX_SEARCH_DEPTH = 60
+# A* costs are ints in tenths of a step, so the open list can be a bucket queue
+MOVE_COST = 10
+WAIT_COST = 21  # waiting costs 2.1 steps, so the search prefers moving
 
 # ---------------------------------------------------------
 # 2. State
@@ -66,7 +70,9 @@ MAX_SEARCH_DEPTH = 60
 robots = {}       # robot_id -> dict
 jobs = {}         # job_id -> dict
 job_queue = []    # queued user jobs
-reservations = {} # (node, time) -> robot_id
+node_reservations = {}  # node -> {time: robot_id}
+robot_reservations = {} # robot_id -> [(node, time), ...] it holds, so they can be dropped directly
+reservation_heap = []   # (time, node, robot_id) min-heap, so expired slots pop off in order
 state_lock = threading.Lock()
 
 # ---------------------------------------------------------
@@ -83,51 +89,187 @@ def build_coords(graph):
 
 NODE_COORDS = build_coords(GRAPH)
 
+def build_tables(graph):
+    # A* works on small int node ids; names only appear at the API boundary.
+    # Returns id -> name, name -> id, and each id's exits plus itself (the
+    # wait move).
+    names = list(graph)
+    ids = {n: i for i, n in enumerate(names)}
+    succ = tuple(tuple(ids[v] for v in graph[n].values()) + (i,) for i, n in enumerate(names))
+    return names, ids, succ
+
+# GRAPH never changes, so its tables are built once
+NODE_NAMES, NODE_IDX, NEIGHBORS = build_tables(GRAPH)
+
+def bfs_dist_to(succ, goal):
+    # hop count from every node to goal, by a BFS over reversed edges. It is the
+    # exact move cost with no other robots around, so A* can use it as a
+    # heuristic in place of Manhattan distance, which the grid layout makes
+    # misleading (cells without a link to their grid neighbour). Nodes that
+    # cannot reach goal get len(succ), more than any real distance.
+    V = len(succ)
+    preds = [[] for _ in range(V)]
+    for u, nbs in enumerate(succ):
+        for v in nbs:
+            if v != u:
+                preds[v].append(u)
+    dist = [V] * V
+    dist[goal] = 0
+    queue = deque([goal])
+    while queue:
+        v = queue.popleft()
+        d = dist[v] + 1
+        for u in preds[v]:
+            if dist[u] == V:
+                dist[u] = d
+                queue.append(u)
+    return tuple(dist)
+
+# DIST_TO[goal][node] for every pair: one BFS per node of GRAPH, done at import
+DIST_TO = tuple(bfs_dist_to(NEIGHBORS, g) for g in range(len(NEIGHBORS)))
+
 def get_manhattan_dist(a,b):
     ax,ay = NODE_COORDS.get(a,(0,0))
     bx,by = NODE_COORDS.get(b,(0,0))
     return abs(ax-bx) + abs(ay-by)
 
-def is_safe(node, t, rid):
-    owner = reservations.get((node,t))
-    if owner and owner != rid:
-        return False
-    for orid, info in robots.items():
-        if orid != rid and info.get('status') == 'idle' and info.get('node') == node:
-            return False
-    return True
-
-def space_time_a_star(graph, start, end, t0, rid, max_time=MAX_SEARCH_DEPTH):
-    open_set = []
-    heapq.heappush(open_set, (0, 0, start, [start]))
-    visited = set()
-    while open_set:
-        f, g, curr, path = heapq.heappop(open_set)
-        current_time = t0 + g
-        if curr == end:
-            return path
-        if g >= max_time:
+def idle_cells(rid, view=None):
+    # nodes where a robot other than rid sits idle, from the live tables
+    # (state_lock held) or a copy from take_snapshot()
+    if view:
+        return [n for orid, n in view['idle'].items() if orid != rid]
+    return [info.get('node') for orid, info in robots.items()
+            if orid != rid and info.get('status') == 'idle']
+
+def space_time_a_star(graph, start, end, t0, rid, max_time=MAX_SEARCH_DEPTH, view=None):
+    if graph is GRAPH:
+        names, ids, succ = NODE_NAMES, NODE_IDX, NEIGHBORS
+    else:
+        names, ids, succ = build_tables(graph)
+    s, e = ids.get(start), ids.get(end)
+    if s is None or e is None:
+        return None
+    # Per-search tables indexed by node id, so the loop below never touches a
+    # name: the heuristic to this goal, each node's reservation slots, and the
+    # cells idle robots sit on. None of them change during a search (state_lock
+    # is held, or we are on a snapshot).
+    h_end = DIST_TO[e] if succ is NEIGHBORS else bfs_dist_to(succ, e)
+    if h_end[s] == len(names):
+        return None  # no route at all, whatever the reservations
+    table = view['reservations'] if view else node_reservations
+    slots_at = [table.get(n) for n in names]
+    V = len(names)
+    blocked = bytearray(V)
+    for n in idle_cells(rid, view):
+        i = ids.get(n)
+        if i is not None:
+            blocked[i] = 1
+    # Search states are packed into one int, step * V + node (step = t - t0), so
+    # g_score and came_from hash small ints rather than building (node, t) tuples.
+    # The open list is a bucket queue, f -> [(g, state), ...], drained from the
+    # lowest non-empty f (LIFO within a bucket). The heuristic is consistent, so
+    # f never drops below the cursor. The path is rebuilt from came_from at the
+    # goal, and the step is kept apart from g because g includes the wait penalty.
+    f = h_end[s] * MOVE_COST  # lowest f that may still hold entries
+    buckets = {f: [(0, s)]}
+    size = 1                  # entries left across all buckets
+    came_from = {}    # state -> previous state
+    g_score = {s: 0}  # cheapest g pushed per state
+    inf = float('inf')
+    while size:
+        bucket = buckets.get(f)
+        if not bucket:
+            f += 1
+            continue
+        g, state = bucket.pop()
+        size -= 1
+        if g > g_score[state]:
+            continue  # stale: a cheaper entry for this state was pushed later
+        step, curr = divmod(state, V)
+        if curr == e:
+            return reconstruct_path(came_from, state, names)
+        if step >= max_time:
             continue
-        neighbors = list(graph[curr].values()) + [curr]  # include wait
-        for nb in neighbors:
-            nt = current_time + 1
-            if (nb, nt) in visited:
+        base = state - curr + V  # the next step's row
+        nt = t0 + step + 1
+        for nb in succ[curr]:  # includes wait
+            ng = g + (WAIT_COST if nb == curr else MOVE_COST)
+            nxt = base + nb
+            if blocked[nb] or ng >= g_score.get(nxt, inf):
                 continue
-            if is_safe(nb, nt, rid):
-                visited.add((nb, nt))
-                ng = g + 1
-                if nb == curr:
-                    ng += 1.1
-                h = get_manhattan_dist(nb, end)
-                heapq.heappush(open_set, (ng + h, ng, nb, path + [nb]))
+            slots = slots_at[nb]
+            if slots:
+                owner = slots.get(nt)
+                if owner and owner != rid:
+                    continue
+            g_score[nxt] = ng
+            came_from[nxt] = state
+            nf = ng + h_end[nb] * MOVE_COST
+            if nf in buckets:
+                buckets[nf].append((ng, nxt))
+            else:
+                buckets[nf] = [(ng, nxt)]
+            size += 1
     return None
 
+def reconstruct_path(came_from, state, names):
+    # walk parent pointers back from the goal state, then flip to start -> goal
+    V = len(names)
+    path = [names[state % V]]
+    while state in came_from:
+        state = came_from[state]
+        path.append(names[state % V])
+    path.reverse()
+    return path
+
 def reserve_path_trajectory(path, t0, rid):
-    keys = [k for k,v in reservations.items() if v == rid]
-    for k in keys:
-        del reservations[k]
+    release_reservations(rid)
+    held = robot_reservations[rid] = []
     for i, n in enumerate(path):
-        reservations[(n, t0 + i)] = rid
+        t = t0 + i
+        node_reservations.setdefault(n, {})[t] = rid
+        held.append((n, t))
+        heapq.heappush(reservation_heap, (t, n, rid))
+
+def drop_slot(n, t, rid):
+    # frees (n, t) if rid still owns it; a later reservation may have taken it over
+    slots = node_reservations.get(n)
+    if slots and slots.get(t) == rid:
+        del slots[t]
+        if not slots:
+            del node_reservations[n]
+
+def release_reservations(rid):
+    # only the robot's own slots, instead of sweeping every reservation
+    for n, t in robot_reservations.pop(rid, ()):
+        drop_slot(n, t, rid)
+
+def prune_reservations(cutoff):
+    # pops just the expired slots; ones already released fail drop_slot's owner check
+    while reservation_heap and reservation_heap[0][0] < cutoff:
+        t, n, rid = heapq.heappop(reservation_heap)
+        drop_slot(n, t, rid)
+
+def path_still_free(path, t0, rid):
+    # re-checks a path planned on a snapshot against the live tables (state_lock held)
+    blocked = set(idle_cells(rid))
+    for i in range(1, len(path)):
+        n = path[i]
+        if n in blocked:
+            return False
+        slots = node_reservations.get(n)
+        owner = slots.get(t0 + i) if slots else None
+        if owner and owner != rid:
+            return False
+    return True
+
+def plan_job_path(start, pickup, drop, t0, rid, view=None):
+    # the two legs of a job; the second starts when the first reaches pickup
+    path1 = space_time_a_star(GRAPH, start, pickup, t0, rid, view=view)
+    if not path1:
+        return None, None
+    path2 = space_time_a_star(GRAPH, pickup, drop, t0 + len(path1) - 1, rid, view=view)
+    return path1, path2
 
 def find_nearest_parking(node):
     candidates = []
@@ -147,12 +289,6 @@ CLOCKWISE = {'n':'e','e':'s','s':'w','w':'n'}
 CCW = {v:k for k,v in CLOCKWISE.items()}
 OPP = {'n':'s','s':'n','e':'w','w':'e'}
 
-def direction_between(a,b):
-    for d, nb in GRAPH[a].items():
-        if nb == b:
-            return d
-    return None
-
 def instruction_from_dirs(cur, target):
     if cur == target:
         return 'S'
@@ -164,26 +300,38 @@ def instruction_from_dirs(cur, target):
         return 'U'
     return 'S'
 
+def build_edge_dirs(graph):
+    # (a, b) -> heading of the move a -> b; the first exit wins, as in a scan of graph[a]
+    table = {}
+    for a, nbrs in graph.items():
+        for d, b in nbrs.items():
+            table.setdefault((a, b), d)
+    return table
+
+EDGE_DIR = build_edge_dirs(GRAPH)
+
+# (facing, wanted heading) -> (command, facing afterwards), for all 16 pairs
+INSTR_TABLE = {}
+for _cur in CLOCKWISE:
+    for _target in CLOCKWISE:
+        _cmd = instruction_from_dirs(_cur, _target)
+        INSTR_TABLE[(_cur, _target)] = (_cmd, {'S': _cur, 'R': CLOCKWISE[_cur],
+                                               'L': CCW[_cur], 'U': OPP[_cur]}[_cmd])
+del _cur, _target, _cmd
+
 def path_to_instr_list(path, initial_dir):
     instrs = []
+    append = instrs.append
     cur = initial_dir
     for i in range(len(path)-1):
-        a = path[i]; b = path[i+1]
-        target = direction_between(a,b)
+        target = EDGE_DIR.get((path[i], path[i+1]))
         if not target:
-            instrs.append('U')
+            # a wait (or a jump with no edge) is sent as a U-turn
+            append('U')
             cur = OPP.get(cur, cur)
             continue
-        cmd = instruction_from_dirs(cur, target)
-        instrs.append(cmd)
-        if cmd == 'R':
-            cur = CLOCKWISE[cur]
-        elif cmd == 'L':
-            cur = CCW[cur]
-        elif cmd == 'U':
-            cur = OPP[cur]
-        else:
-            cur = cur
+        cmd, cur = INSTR_TABLE[(cur, target)]
+        append(cmd)
     return instrs, cur
 
 def build_plan_array(path, instr_list):
@@ -214,65 +362,118 @@ def create_system_job(pickup, drop, rid):
 # ---------------------------------------------------------
 # 5. Allocator thread (assigns idle robots)
 # ---------------------------------------------------------
+def take_snapshot():
+    # copies what planning reads so A* can run without state_lock; call with the lock held
+    return {
+        'reservations': {n: dict(slots) for n, slots in node_reservations.items()},
+        'held': {rid: list(held) for rid, held in robot_reservations.items()},
+        'idle': {rid: info.get('node') for rid, info in robots.items() if info.get('status') == 'idle'},
+    }
+
+def reserve_in_view(view, path, t0, rid):
+    # reserve_path_trajectory() applied to a snapshot
+    res = view['reservations']
+    for n, t in view['held'].pop(rid, ()):
+        slots = res.get(n)
+        if slots and slots.get(t) == rid:
+            del slots[t]
+    held = view['held'][rid] = []
+    for i, n in enumerate(path):
+        res.setdefault(n, {})[t0 + i] = rid
+        held.append((n, t0 + i))
+
+def plan_pass(pending, view, current_t):
+    # plans queued jobs against a snapshot, without state_lock; each planned path
+    # is written back into the snapshot so later jobs in the pass route around it
+    plans = []
+    idle = view['idle']
+    for job in pending:
+        if not idle:
+            break
+        # pick nearest idle robot by manhattan
+        rid = min(idle, key=lambda r: get_manhattan_dist(idle[r], job['pickup']))
+        start_node = idle[rid]
+        path1, path2 = plan_job_path(start_node, job['pickup'], job['drop'], current_t, rid, view)
+        if path2:
+            reserve_in_view(view, path1 + path2[1:], current_t, rid)
+            del idle[rid]
+            plans.append((job, rid, start_node, path1, path2))
+    return plans
+
+def commit_plans(plans, current_t, pending_emits):
+    # applies plan_pass() results with state_lock held; a plan the live state has
+    # overtaken is dropped and its job stays queued for the next tick. Dashboard
+    # events go to pending_emits for flush_emits().
+    queued = {id(j) for j in job_queue}
+    assigned = 0
+    for job, rid, start_node, path1, path2 in plans:
+        info = robots.get(rid)
+        if job['status'] != 'queued' or id(job) not in queued:
+            continue
+        if not info or info.get('status') != 'idle' or info.get('node') != start_node:
+            continue
+        full_path = path1 + path2[1:]
+        if not path_still_free(full_path, current_t, rid):
+            continue
+        reserve_path_trajectory(full_path, current_t, rid)
+        start_dir = info.get('dir', 's')
+
+        # ---- BUILD PLAN HERE ----
+        instr1, facing_after_pickup = path_to_instr_list(path1, start_dir)
+        instr2, _ = path_to_instr_list(path2, facing_after_pickup)
+
+        # FIX: append entire instr2 (not instr2[1:]) so instruction count matches full_path edges
+        full_instr = instr1 + instr2
+
+        plan = []
+        if len(full_path) - 1 == len(full_instr):
+            for i in range(len(full_path)-1):
+                plan.append([full_path[i], full_instr[i]])
+            plan.append([full_path[-1], 'D'])
+        else:
+            # fallback: create a simple final D step
+            plan.append([full_path[-1], 'D'])
+
+        job['assigned_robot'] = rid
+        job['status'] = 'assigned'
+        job['path'] = full_path
+        job['plan'] = plan
+        job['plan_str'] = plan_to_str(plan)
+        job['progress_index'] = None
+        assigned += 1
+
+        info['status'] = 'busy'
+        info['current_job'] = job['id']
+        info['current_path'] = full_path
+
+        pending_emits.append(('job_update', {'job': dict(job)}))
+        pending_emits.append(('robot_update', {'robot': rid, 'info': dict(info)}))
+    return assigned
+
+def flush_emits(pending_emits):
+    # sends events collected under state_lock once it is released; the payloads
+    # are copies, so encoding them cannot race with later state changes
+    for event, payload in pending_emits:
+        socketio.emit(event, payload)
+
 def allocator_loop():
     while True:
         with state_lock:
             current_t = int(time.time())
             # cleanup old reservations
-            old = [k for k in reservations if k[1] < current_t]
-            for k in old: del reservations[k]
+            prune_reservations(current_t)
             
             pending = [j for j in job_queue if j['status'] == 'queued']
-            for job in pending:
-                idle = [r for r, info in robots.items() if info.get('status') == 'idle']
-                if not idle:
-                    break
-                # pick nearest idle robot by manhattan
-                idle.sort(key=lambda rid: get_manhattan_dist(robots[rid]['node'], job['pickup']))
-                rid = idle[0]
-                start_node = robots[rid]['node']
-                start_dir = robots[rid].get('dir', 's')
-
-                # 1. Path to pickup
-                path1 = space_time_a_star(GRAPH, start_node, job['pickup'], current_t, rid)
-                if path1:
-                    arrival_t = current_t + len(path1) - 1
-                    # 2. Path to drop
-                    path2 = space_time_a_star(GRAPH, job['pickup'], job['drop'], arrival_t, rid)
-                    if path2:
-                        full_path = path1 + path2[1:]
-                        reserve_path_trajectory(full_path, current_t, rid)
-                        
-                        # ---- BUILD PLAN HERE ----
-                        instr1, facing_after_pickup = path_to_instr_list(path1, start_dir)
-                        instr2, _ = path_to_instr_list(path2, facing_after_pickup)
-
-                        # FIX: append entire instr2 (not instr2[1:]) so instruction count matches full_path edges
-                        full_instr = instr1 + instr2
-
-                        plan = []
-                        if len(full_path) - 1 == len(full_instr):
-                            for i in range(len(full_path)-1):
-                                plan.append([full_path[i], full_instr[i]])
-                            plan.append([full_path[-1], 'D'])
-                        else:
-                            # fallback: create a simple final D step
-                            plan.append([full_path[-1], 'D'])
-
-                        job['assigned_robot'] = rid
-                        job['status'] = 'assigned'
-                        job['path'] = full_path
-                        job['plan'] = plan
-                        job['plan_str'] = plan_to_str(plan)
-                        job['progress_index'] = None
-                        job_queue.remove(job)
-
-                        robots[rid]['status'] = 'busy'
-                        robots[rid]['current_job'] = job['id']
-                        robots[rid]['current_path'] = full_path
-
-                        socketio.emit('job_update', {'job': job})
-                        socketio.emit('robot_update', {'robot': rid, 'info': robots[rid]})
+            view = take_snapshot() if pending else None
+        # A* runs on the snapshot without state_lock; only the commit takes it
+        plans = plan_pass(pending, view, current_t) if view else []
+        if plans:
+            pending_emits = []
+            with state_lock:
+                if commit_plans(plans, current_t, pending_emits):
+                    # one sweep per tick instead of a list.remove() per assigned job
+                    job_queue[:] = [j for j in job_queue if j['status'] == 'queued']
+            flush_emits(pending_emits)
         time.sleep(0.5)
 
 threading.Thread(target=allocator_loop, daemon=True).start()
@@ -289,31 +490,40 @@ def request_path():
     pickup = data.get('pickup')
     drop = data.get('drop')
 
-    if not rid or rid not in robots:
-        return jsonify({'error': 'unknown robot'}), 400
-    
     with state_lock:
-        robots[rid]['node'] = node
-        robots[rid]['dir'] = facing
-        robots[rid]['last_seen'] = time.time()
+        info = robots.get(rid)
+        if info is None:
+            return jsonify({'error': 'unknown robot'}), 400
+        info['node'] = node
+        info['dir'] = facing
+        info['last_seen'] = time.time()
         now = int(time.time())
-        
-        path_to_pickup = space_time_a_star(GRAPH, node, pickup, now, rid)
-        if not path_to_pickup: return jsonify({'error': 'no path to pickup'}), 500
-        
-        arrive_t = now + len(path_to_pickup) - 1
-        path_pickup_to_drop = space_time_a_star(GRAPH, pickup, drop, arrive_t, rid)
-        if not path_pickup_to_drop: return jsonify({'error': 'no path pickup->drop'}), 500
+        view = take_snapshot()
 
+    # both searches run on the snapshot without state_lock
+    path_to_pickup, path_pickup_to_drop = plan_job_path(node, pickup, drop, now, rid, view)
+    if not path_to_pickup: return jsonify({'error': 'no path to pickup'}), 500
+    if not path_pickup_to_drop: return jsonify({'error': 'no path pickup->drop'}), 500
+
+    with state_lock:
+        info = robots.get(rid)
+        if info is None:
+            return jsonify({'error': 'unknown robot'}), 400
         full_path = path_to_pickup + path_pickup_to_drop[1:]
+        if not path_still_free(full_path, now, rid):
+            # another plan took a cell we routed through; search again on the live tables
+            path_to_pickup, path_pickup_to_drop = plan_job_path(node, pickup, drop, now, rid)
+            if not path_to_pickup: return jsonify({'error': 'no path to pickup'}), 500
+            if not path_pickup_to_drop: return jsonify({'error': 'no path pickup->drop'}), 500
+            full_path = path_to_pickup + path_pickup_to_drop[1:]
         reserve_path_trajectory(full_path, now, rid)
 
-        robots[rid]['status'] = 'busy'
-        robots[rid]['current_path'] = full_path
+        info['status'] = 'busy'
+        info['current_path'] = full_path
 
         job = create_system_job(pickup, drop, rid)
         job['path'] = full_path
-        robots[rid]['current_job'] = job['id']
+        info['current_job'] = job['id']
 
         instr1, facing_after_pickup = path_to_instr_list(path_to_pickup, facing)
         instr2, _ = path_to_instr_list(path_pickup_to_drop, facing_after_pickup)
@@ -325,10 +535,10 @@ def request_path():
         job['plan'] = plan
         job['plan_str'] = plan_to_str(plan)
         job['progress_index'] = None
-        
-        socketio.emit('job_update', {'job': job})
-        socketio.emit('robot_update', {'robot': rid, 'info': robots[rid]})
-        return jsonify({'ok': True, 'plan': plan, 'plan_str': job['plan_str'], 'job_id': job['id']}), 200
+        pending_emits = [('job_update', {'job': dict(job)}),
+                         ('robot_update', {'robot': rid, 'info': dict(info)})]
+    flush_emits(pending_emits)
+    return jsonify({'ok': True, 'plan': plan, 'plan_str': job['plan_str'], 'job_id': job['id']}), 200
 
 @app.route('/register_robot', methods=['POST'])
 def register_robot():
@@ -338,10 +548,12 @@ def register_robot():
     direction = (data.get('dir') or data.get('facing') or 's').lower()
     color = random_color()
     with state_lock:
-        if rid in robots:
-            color = robots[rid].get('color', color)
-        robots[rid] = {'status': 'idle', 'node': node, 'last_seen': time.time(), 'color': color, 'current_path': [], 'dir': direction}
-    socketio.emit('robot_update', {'robot': rid, 'info': robots[rid]})
+        old = robots.get(rid)
+        if old is not None:
+            color = old.get('color', color)
+        info = robots[rid] = {'status': 'idle', 'node': node, 'last_seen': time.time(), 'color': color, 'current_path': [], 'dir': direction}
+        payload = {'robot': rid, 'info': dict(info)}
+    socketio.emit('robot_update', payload)
     return jsonify({'robot_id': rid, 'color': color}), 200
 
 @app.route('/submit_job', methods=['POST'])
@@ -354,17 +566,19 @@ def submit_job():
     with state_lock:
         job_queue.append(job)
         jobs[job_id] = job
-    socketio.emit('job_update', {'job': job})
+        payload = {'job': dict(job)}
+    socketio.emit('job_update', payload)
     return jsonify({'job_id': job_id}), 200
 
 @app.route('/poll_task', methods=['GET'])
 def poll_task():
     rid = request.args.get('robot_id')
     with state_lock:
-        if rid not in robots:
+        info = robots.get(rid)
+        if info is None:
             return jsonify({'error': 'unknown'}), 400
-        robots[rid]['last_seen'] = time.time()
-        jid = robots[rid].get('current_job')
+        info['last_seen'] = time.time()
+        jid = info.get('current_job')
         if jid:
             return jsonify({'job': jobs.get(jid)}), 200
         return jsonify({'job': None}), 200
@@ -378,23 +592,25 @@ def update_location():
     reported_dir = (data.get('dir') or data.get('facing') or None)
     step_index = data.get('step_index')
 
+    pending_emits = []
     with state_lock:
-        if rid not in robots:
+        info = robots.get(rid)
+        if info is None:
             return jsonify({'error': 'unknown'}), 400
         
-        robots[rid]['node'] = node
-        robots[rid]['last_seen'] = time.time()
+        info['node'] = node
+        info['last_seen'] = time.time()
         if reported_dir:
-            robots[rid]['dir'] = reported_dir.lower()
+            info['dir'] = reported_dir.lower()
         
         # shrink current_path if robot provided node in it
-        path = robots[rid].get('current_path', [])
+        path = info.get('current_path', [])
         if node in path:
-            robots[rid]['current_path'] = path[path.index(node):]
+            info['current_path'] = path[path.index(node):]
         
-        jid = robots[rid].get('current_job')
-        if jid and jid in jobs and step_index is not None:
-            job = jobs[jid]
+        jid = info.get('current_job')
+        job = jobs.get(jid) if jid else None
+        if job and step_index is not None:
             try:
                 si = int(step_index)
             except:
@@ -404,22 +620,20 @@ def update_location():
                 job.setdefault('progress_trace', []).append({
                     'step_index': si,
                     'node': node,
-                    'dir': robots[rid]['dir'],
+                    'dir': info['dir'],
                     'ts': time.time()
                 })
-                socketio.emit('job_update', {'job': job})
+                pending_emits.append(('job_update', {'job': dict(job)}))
 
         if status == 'job_done':
-            jid = robots[rid].get('current_job')
-            if jid and jid in jobs:
-                jobs[jid]['status'] = 'done'
-                socketio.emit('job_update', {'job': jobs[jid]})
-            robots[rid]['status'] = 'idle'
-            robots[rid]['current_path'] = []
-            robots[rid].pop('current_job', None)
-            # clear reservations
-            keys = [k for k, v in reservations.items() if v == rid]
-            for k in keys: del reservations[k]
+            job = jobs.get(jid) if jid else None
+            if job:
+                job['status'] = 'done'
+                pending_emits.append(('job_update', {'job': dict(job)}))
+            info['status'] = 'idle'
+            info['current_path'] = []
+            info.pop('current_job', None)
+            release_reservations(rid)
             # try auto-parking
             if node not in PARKING_NODES:
                 parking_spot = find_nearest_parking(node)
@@ -429,20 +643,21 @@ def update_location():
                     park_path = space_time_a_star(GRAPH, node, parking_spot, current_t, rid)
                     if park_path:
                         reserve_path_trajectory(park_path, current_t, rid)
-                        current_dir = robots[rid].get('dir', 's')
+                        current_dir = info.get('dir', 's')
                         instrs, _ = path_to_instr_list(park_path, current_dir)
                         plan = build_plan_array(park_path, instrs)
                         parking_job['plan'] = plan
                         parking_job['plan_str'] = plan_to_str(plan)
                         parking_job['path'] = park_path
-                        robots[rid]['status'] = 'busy'
-                        robots[rid]['current_job'] = parking_job['id']
-                        robots[rid]['current_path'] = park_path
-                        socketio.emit('job_update', {'job': parking_job})
+                        info['status'] = 'busy'
+                        info['current_job'] = parking_job['id']
+                        info['current_path'] = park_path
+                        pending_emits.append(('job_update', {'job': dict(parking_job)}))
                     else:
-                        jobs[parking_job['id']]['status'] = 'failed'
+                        parking_job['status'] = 'failed'
 
-        socketio.emit('robot_update', {'robot': rid, 'info': robots[rid]})
+        pending_emits.append(('robot_update', {'robot': rid, 'info': dict(info)}))
+    flush_emits(pending_emits)
     return jsonify({'ok': True}), 200
 
 @app.route('/report_execution', methods=['POST'])
@@ -452,53 +667,61 @@ def report_execution():
     jid = data.get('job_id')
     nodes_with_dir = data.get('nodes_with_dir')
 
-    if not rid or rid not in robots:
-        return jsonify({'error': 'unknown'}), 400
-
+    pending_emits = []
     with state_lock:
+        info = robots.get(rid)
+        if info is None:
+            return jsonify({'error': 'unknown'}), 400
         if nodes_with_dir and isinstance(nodes_with_dir, list) and len(nodes_with_dir) > 0:
             last = nodes_with_dir[-1]
-            robots[rid]['node'] = last.get('node', robots[rid].get('node'))
-            robots[rid]['dir'] = (last.get('dir') or robots[rid].get('dir', 's')).lower()
+            info['node'] = last.get('node', info.get('node'))
+            info['dir'] = (last.get('dir') or info.get('dir', 's')).lower()
             report = {'nodes_with_dir': nodes_with_dir, 'ts': time.time()}
         else:
             report = {'ts': time.time()}
 
-        if jid and jid in jobs:
-            jobs[jid].setdefault('reports', []).append({'robot': rid, **report})
-            jobs[jid]['status'] = 'done'
-            socketio.emit('job_update', {'job': jobs[jid]})
+        job = jobs.get(jid) if jid else None
+        if job:
+            job.setdefault('reports', []).append({'robot': rid, **report})
+            job['status'] = 'done'
+            pending_emits.append(('job_update', {'job': dict(job)}))
 
-        robots[rid]['status'] = 'idle'
-        robots[rid]['current_path'] = []
-        robots[rid].pop('current_job', None)
-        keys = [k for k, v in reservations.items() if v == rid]
-        for k in keys: del reservations[k]
+        info['status'] = 'idle'
+        info['current_path'] = []
+        info.pop('current_job', None)
+        release_reservations(rid)
 
-        socketio.emit('robot_update', {'robot': rid, 'info': robots[rid]})
+        pending_emits.append(('robot_update', {'robot': rid, 'info': dict(info)}))
+    flush_emits(pending_emits)
     return jsonify({'ok': True}), 200
 
 @app.route('/reset_sim', methods=['POST'])
 def reset_sim():
+    pending_emits = []
     with state_lock:
         job_queue.clear()
-        reservations.clear()
+        node_reservations.clear()
+        robot_reservations.clear()
+        reservation_heap.clear()
         for j in jobs.values():
             if j['status'] == 'assigned':
                 j['status'] = 'failed'
-                socketio.emit('job_update', {'job': j})
-        for r in robots.values():
+                pending_emits.append(('job_update', {'job': dict(j)}))
+        for rid, r in robots.items():
             r['status'] = 'idle'
             r['current_path'] = []
             r.pop('current_job', None)
-            socketio.emit('robot_update', {'robot': r.get('id', 'unknown'), 'info': r})
+            pending_emits.append(('robot_update', {'robot': rid, 'info': dict(r)}))
+    flush_emits(pending_emits)
     return jsonify({'ok': True}), 200
 
 @socketio.on('connect')
 def on_connect():
     with state_lock:
-        socketio.emit('layout', {'nodes': NODE_COORDS, 'graph': GRAPH})
-        socketio.emit('state_snapshot', {'robots': robots, 'jobs': list(jobs.values())})
+        snapshot = {'robots': {rid: dict(info) for rid, info in robots.items()},
+                    'jobs': [dict(j) for j in jobs.values()]}
+    socketio.emit('layout', {'nodes': NODE_COORDS, 'graph': GRAPH})
+    socketio.emit('state_snapshot', snapshot)
 
 # ---------------------------------------------------------
 # 7. UI (node labels now drawn inside node circles)
@@ -1,10 +1,11 @@
 # server.py
 import time
 import uuid
+import hashlib
 import heapq
 import threading
 import random
-from flask import Flask, request, jsonify, render_template_string
+from flask import Flask, request, jsonify, Response
 from flask_socketio import SocketIO
 
 app = Flask(__name__)
@@ -216,6 +217,8 @@ def create_system_job(pickup, drop, rid):
 # ---------------------------------------------------------
 def allocator_loop():
     while True:
+        # Dashboard updates are collected under the lock and sent as one batch afterwards
+        pending_emits = []
         with state_lock:
             current_t = int(time.time())
             # cleanup old reservations
@@ -242,8 +245,10 @@ def allocator_loop():
                         robots[rid]['status'] = 'busy'
                         robots[rid]['current_job'] = job['id']
                         robots[rid]['current_path'] = full_path
-                        socketio.emit('job_update', {'job': job})
-                        socketio.emit('robot_update', {'robot': rid, 'info': robots[rid]})
+                        pending_emits.append(('job_update', {'job': dict(job)}))
+                        pending_emits.append(('robot_update', {'robot': rid, 'info': dict(robots[rid])}))
+        if pending_emits:
+            socketio.emit('batch_update', {'updates': pending_emits})
         time.sleep(0.5)
 
 threading.Thread(target=allocator_loop, daemon=True).start()
@@ -649,6 +654,7 @@ HTML_PAGE = """
         transform: translate(-50%, -150%);
         white-space: nowrap;
     }
+    #tooltip.visible { opacity: 1; }
 
     /* Lists */
     .list-item { 
@@ -660,6 +666,11 @@ HTML_PAGE = """
     }
     .list-item:hover { background: #f1f5f9; }
     .list-item:last-child { border-bottom: none; }
+
+    /* Virtualized list: fixed-height rows, only the visible window is rendered */
+    .vlist { position: relative; overflow-y: auto; height: 320px; flex: 1 1 auto; }
+    .vlist-window { position: absolute; top: 0; left: 0; right: 0; will-change: transform; }
+    .vlist-window > .list-item { height: 64px; box-sizing: border-box; overflow: hidden; padding-top: 0.6rem; padding-bottom: 0.6rem; }
     
     .badge-status { font-size: 0.7rem; padding: 4px 8px; border-radius: 6px; float: right; font-weight: 600; letter-spacing: 0.3px; }
     .bg-idle { background: #e2e8f0; color: #475569; }
@@ -728,7 +739,12 @@ HTML_PAGE = """
         </div>
         <div class="map-container" id="mapwrap">
             <svg id="map" width="100%" height="100%">
-                <g id="viewport"></g>
+                <g id="viewport">
+                    <g id="edge-layer"></g>
+                    <g id="path-layer"></g>
+                    <g id="node-layer"></g>
+                    <g id="robot-layer"></g>
+                </g>
             </svg>
         </div>
     </div>
@@ -738,13 +754,13 @@ HTML_PAGE = """
             <div class="card-header">
                 <span><i class="fas fa-microchip me-2 text-primary"></i> Fleet</span>
             </div>
-            <div class="card-body p-0" id="robots-list"></div>
+            <div class="card-body p-0 vlist" id="robots-list"></div>
         </div>
         <div class="card flex-grow-1" style="min-height: 200px;">
             <div class="card-header">
                 <span><i class="fas fa-clipboard-list me-2 text-warning"></i> Job Queue</span>
             </div>
-            <div class="card-body p-0" id="jobs-list"></div>
+            <div class="card-body p-0 vlist" id="jobs-list"></div>
         </div>
     </div>
 </div>
@@ -753,76 +769,122 @@ HTML_PAGE = """
 const socket = io();
 let NODE_COORDS = {}, GRAPH_DATA = {}, ROBOTS = {}, JOBS = {};
 const viewport = document.getElementById('viewport');
+const edgeLayer = document.getElementById('edge-layer');
+const pathLayer = document.getElementById('path-layer');
+const nodeLayer = document.getElementById('node-layer');
+const robotLayer = document.getElementById('robot-layer');
 const tooltip = document.getElementById('tooltip');
 const scaleFactor = 40; 
 const offsetX = 100, offsetY = 100; 
 let transform = { x: 0, y: 0, k: 1 }; 
 let isDragging = false, startDrag = { x: 0, y: 0 };
+const PARKING_NODES = new Set(['11','12','13','15','26','31','46','51','56','81','82','83','84','85','86']);
 
 socket.on('connect', () => console.log('Connected'));
 socket.on('layout', d => { NODE_COORDS = d.nodes; GRAPH_DATA = d.graph; drawMap(); });
 socket.on('state_snapshot', d => { ROBOTS = d.robots||{}; JOBS={}; (d.jobs||[]).forEach(j=>JOBS[j.id]=j); updateUI(); });
-socket.on('robot_update', d => { ROBOTS[d.robot] = d.info; updateUI(); });
-socket.on('job_update', d => { JOBS[d.job.id] = d.job; updateUI(); });
+// Each update type only repaints the parts of the page that depend on it
+const UPDATE_HANDLERS = {
+    robot_update: d => { ROBOTS[d.robot] = d.info; return 'robots'; },
+    job_update: d => { JOBS[d.job.id] = d.job; return 'jobs'; },
+};
+// Coalesce bursts of updates into a single repaint per animation frame
+const uiDirty = new Set();
+function scheduleUI(part) {
+    if(uiDirty.has(part)) return;
+    const first = uiDirty.size === 0;
+    uiDirty.add(part);
+    if(!first) return;
+    requestAnimationFrame(() => {
+        if(uiDirty.has('robots')) { updateRobotList(); updateRobotsOnMap(); }
+        if(uiDirty.has('jobs')) updateJobList();
+        uiDirty.clear();
+    });
+}
+socket.on('robot_update', d => scheduleUI(UPDATE_HANDLERS.robot_update(d)));
+socket.on('job_update', d => scheduleUI(UPDATE_HANDLERS.job_update(d)));
+socket.on('batch_update', d => {
+    (d.updates || []).forEach(([ev, payload]) => { if(UPDATE_HANDLERS[ev]) scheduleUI(UPDATE_HANDLERS[ev](payload)); });
+});
 
 function updateUI() {
+    updateRobotList();
+    updateJobList();
+    updateRobotsOnMap();
+}
+
+function updateRobotList() {
     document.getElementById('stat-robots').innerText = Object.keys(ROBOTS).length;
-    document.getElementById('stat-jobs').innerText = Object.values(JOBS).filter(j=>j.status==='assigned').length;
-    
-    // Robots List
-    const rList = document.getElementById('robots-list');
-    rList.innerHTML = '';
-    if(Object.keys(ROBOTS).length === 0) rList.innerHTML = '<div class="p-3 text-center text-muted small">No active robots</div>';
+    robotsView.setItems(Object.entries(ROBOTS));
+}
 
-    Object.keys(ROBOTS).forEach(id => {
-        const r = ROBOTS[id];
-        const statusClass = r.status === 'idle' ? 'bg-idle' : 'bg-busy';
-        // Hover events to trigger map highlight
-        rList.innerHTML += `
-        <div class="list-item" onmouseenter="highlightRobot('${id}')" onmouseleave="unHighlightRobot('${id}')">
-            <div class="d-flex align-items-center justify-content-between">
-                <div class="d-flex align-items-center">
-                    <div style="background:${r.color}; width:10px; height:10px; border-radius:50%; margin-right:10px; box-shadow:0 0 4px ${r.color}"></div>
-                    <div>
-                        <div style="font-weight:600; color:var(--text-primary)">${id.substring(0,4).toUpperCase()}</div>
-                        <div class="small text-muted">Node: ${r.node}</div>
-                    </div>
-                </div>
-                <span class="badge-status ${statusClass}">${r.status.toUpperCase()}</span>
-            </div>
-        </div>`;
-    });
+function updateJobList() {
+    document.getElementById('stat-jobs').innerText = Object.values(JOBS).filter(j=>j.status==='assigned').length;
+    jobsView.setItems(Object.values(JOBS).sort((a,b) => b.submitted_ts - a.submitted_ts));
+}
 
-    // Jobs List
-    const jList = document.getElementById('jobs-list');
-    jList.innerHTML = '';
-    const sorted = Object.values(JOBS).sort((a,b) => b.submitted_ts - a.submitted_ts);
-    
-    if(sorted.length === 0) jList.innerHTML = '<div class="p-3 text-center text-muted small">No active jobs</div>';
+// --- Virtualized Robot / Job Lists ---
+// Only the rows inside the scroll viewport exist in the DOM; scrolling re-renders via rAF.
+const ROW_HEIGHT = 64;
+function virtualList(container, renderRow, emptyHtml) {
+    const spacer = document.createElement('div');
+    const win = document.createElement('div');
+    win.className = 'vlist-window';
+    container.appendChild(spacer); container.appendChild(win);
+    let items = [], pending = false;
+    function render() {
+        pending = false;
+        if(!items.length) { spacer.style.height = '0px'; win.style.transform = ''; win.innerHTML = emptyHtml; return; }
+        const first = Math.floor(container.scrollTop / ROW_HEIGHT);
+        const last = Math.min(items.length, first + Math.ceil(container.clientHeight / ROW_HEIGHT) + 1);
+        spacer.style.height = (items.length * ROW_HEIGHT) + 'px';
+        win.style.transform = `translateY(${first * ROW_HEIGHT}px)`;
+        let html = '';
+        for(let i = first; i < last; i++) html += renderRow(items[i]);
+        win.innerHTML = html;
+    }
+    container.addEventListener('scroll', () => { if(pending) return; pending = true; requestAnimationFrame(render); });
+    return { setItems(list) { items = list; render(); } };
+}
 
-    sorted.forEach(j => {
-        let cls = 'job-queued';
-        let icon = '<i class="fas fa-clock text-warning"></i>';
-        if(j.status === 'assigned') { cls = 'job-assigned'; icon = '<i class="fas fa-spinner fa-spin text-success"></i>'; }
-        if(j.status === 'done') { cls = 'job-done'; icon = '<i class="fas fa-check-circle"></i>'; }
-        
-        // Hover events to trigger map node highlights
-        jList.innerHTML += `
-        <div class="list-item ${cls}" onmouseenter="highlightJobNodes('${j.pickup}', '${j.drop}')" onmouseleave="clearJobHighlights()">
-            <div class="d-flex justify-content-between align-items-center mb-1">
-                <strong><span class="text-muted">#</span>${j.id.substring(0,4)}</strong> 
-                <span style="font-size:0.75em">${icon} ${j.status}</span>
-            </div>
-            <div class="d-flex align-items-center gap-2 text-muted" style="font-size:0.85em">
-                <span class="badge bg-white border text-dark">${j.pickup}</span>
-                <i class="fas fa-arrow-right small"></i>
-                <span class="badge bg-white border text-dark">${j.drop}</span>
+const robotsView = virtualList(document.getElementById('robots-list'), ([id, r]) => {
+    const statusClass = r.status === 'idle' ? 'bg-idle' : 'bg-busy';
+    // Hover events to trigger map highlight
+    return `
+    <div class="list-item" onmouseenter="highlightRobot('${id}')" onmouseleave="unHighlightRobot('${id}')">
+        <div class="d-flex align-items-center justify-content-between">
+            <div class="d-flex align-items-center">
+                <div style="background:${r.color}; width:10px; height:10px; border-radius:50%; margin-right:10px; box-shadow:0 0 4px ${r.color}"></div>
+                <div>
+                    <div style="font-weight:600; color:var(--text-primary)">${id.substring(0,4).toUpperCase()}</div>
+                    <div class="small text-muted">Node: ${r.node}</div>
+                </div>
             </div>
-        </div>`;
-    });
+            <span class="badge-status ${statusClass}">${r.status.toUpperCase()}</span>
+        </div>
+    </div>`;
+}, '<div class="p-3 text-center text-muted small">No active robots</div>');
+
+const jobsView = virtualList(document.getElementById('jobs-list'), j => {
+    let cls = 'job-queued';
+    let icon = '<i class="fas fa-clock text-warning"></i>';
+    if(j.status === 'assigned') { cls = 'job-assigned'; icon = '<i class="fas fa-spinner fa-spin text-success"></i>'; }
+    if(j.status === 'done') { cls = 'job-done'; icon = '<i class="fas fa-check-circle"></i>'; }
     
-    drawMap(); // Redraw to update positions
-}
+    // Hover events to trigger map node highlights
+    return `
+    <div class="list-item ${cls}" onmouseenter="highlightJobNodes('${j.pickup}', '${j.drop}')" onmouseleave="clearJobHighlights()">
+        <div class="d-flex justify-content-between align-items-center mb-1">
+            <strong><span class="text-muted">#</span>${j.id.substring(0,4)}</strong> 
+            <span style="font-size:0.75em">${icon} ${j.status}</span>
+        </div>
+        <div class="d-flex align-items-center gap-2 text-muted" style="font-size:0.85em">
+            <span class="badge bg-white border text-dark">${j.pickup}</span>
+            <i class="fas fa-arrow-right small"></i>
+            <span class="badge bg-white border text-dark">${j.drop}</span>
+        </div>
+    </div>`;
+}, '<div class="p-3 text-center text-muted small">No active jobs</div>');
 
 // --- Visual Interaction Helpers ---
 function highlightRobot(id) {
@@ -837,58 +899,69 @@ function highlightRobot(id) {
     }
 }
 function unHighlightRobot(id) {
-    drawMap(); // Simplest way to reset transforms
+    const el = document.getElementById(`robot-grp-${id}`);
+    if(el) {
+        el.setAttribute('transform', originalTransforms[id]);
+        const circle = el.querySelector('circle');
+        circle.style.strokeWidth = '';
+        circle.style.stroke = '';
+    }
 }
+// Node circles are indexed when initMap() creates them, so hover needs no DOM queries
+let NODE_CIRCLE_ELS = {};
+const HIGHLIGHTED = new Set();
 function highlightJobNodes(p, d) {
-    const pEl = document.getElementById(`node-${p}`);
-    const dEl = document.getElementById(`node-${d}`);
-    if(pEl) pEl.querySelector('circle').classList.add('highlight-node');
-    if(dEl) dEl.querySelector('circle').classList.add('highlight-node');
+    for(const n of [p, d]) {
+        const el = NODE_CIRCLE_ELS[n];
+        if(el) { el.classList.add('highlight-node'); HIGHLIGHTED.add(el); }
+    }
 }
 function clearJobHighlights() {
-    document.querySelectorAll('.highlight-node').forEach(el => el.classList.remove('highlight-node'));
+    HIGHLIGHTED.forEach(el => el.classList.remove('highlight-node'));
+    HIGHLIGHTED.clear();
 }
 
+const ORIGIN_PX = {x:0, y:0};
 function nodeToPixel(id) {
     const n = NODE_COORDS[id];
-    return n ? {x: offsetX + n[0]*scaleFactor, y: offsetY + n[1]*scaleFactor} : {x:0,y:0};
+    return n ? {x: offsetX + n[0]*scaleFactor, y: offsetY + n[1]*scaleFactor} : ORIGIN_PX;
+}
+
+// Pixel positions per node (one lookup per node instead of one per edge), rebuilt with the layout
+let PX = {};
+const px = n => PX[n] || ORIGIN_PX;
+const originalTransforms = {};
+
+function clearLayer(layer) {
+    while (layer.firstChild) layer.removeChild(layer.firstChild);
 }
 
+// Full redraw: static layout plus robots
 function drawMap() {
-    // Preserve viewport state if dragging
-    if(isDragging) return; 
+    initMap();
+    updateRobotsOnMap();
+}
 
-    // Clear only if we aren't amidst an animation frame to avoid flicker, 
-    // but for this simple app, clearing is fine.
-    while (viewport.firstChild) viewport.removeChild(viewport.firstChild);
+// Static layers (edges + nodes); only needs to run when the layout changes
+function initMap() {
+    clearLayer(edgeLayer); clearLayer(nodeLayer);
+    NODE_CIRCLE_ELS = {}; HIGHLIGHTED.clear();
+
+    PX = {};
+    for(const n in NODE_COORDS) { const c = NODE_COORDS[n]; PX[n] = {x: offsetX + c[0]*scaleFactor, y: offsetY + c[1]*scaleFactor}; }
     
     // 1. Edges
     for(let u in GRAPH_DATA) {
-        const p1 = nodeToPixel(u);
+        const p1 = px(u);
         for(let d in GRAPH_DATA[u]) {
             const v = GRAPH_DATA[u][d];
-            if(NODE_COORDS[v]) createLine(p1, nodeToPixel(v), 'edge-line');
+            if(NODE_COORDS[v]) createLine(p1, PX[v], 'edge-line');
         }
     }
 
-    // 2. Robot Paths (Draw under robots)
-    for(let id in ROBOTS) {
-        const r = ROBOTS[id];
-        if(r.current_path && r.current_path.length > 0) {
-            let pts = `${nodeToPixel(r.node).x},${nodeToPixel(r.node).y} `;
-            r.current_path.forEach(n => { const p = nodeToPixel(n); pts += `${p.x},${p.y} `; });
-            const line = document.createElementNS('http://www.w3.org/2000/svg','polyline');
-            line.setAttribute('points', pts);
-            line.setAttribute('class', 'robot-path');
-            line.setAttribute('stroke', r.color);
-            viewport.appendChild(line);
-        }
-    }
-
-    // 3. Nodes
-    const parkingNodes = ['11','12','13','15','26','31','46','51','56','81','82','83','84','85','86'];
+    // 2. Nodes
     for(let n in NODE_COORDS) {
-        const p = nodeToPixel(n);
+        const p = PX[n];
         const g = createGroup(p.x, p.y);
         g.setAttribute('id', `node-${n}`);
         
@@ -896,13 +969,14 @@ function drawMap() {
         let r = 4;
         let cls = 'node-circle';
         
-        if(parkingNodes.includes(n)) {
+        if(PARKING_NODES.has(n)) {
             cls += ' node-parking';
             r = 4.5;
         }
         
         c.setAttribute('r', r); 
         c.setAttribute('class', cls);
+        NODE_CIRCLE_ELS[n] = c;
         
         // Node Hover Tooltip
         c.onmouseenter = (e) => showTooltip(e, `Node: ${n}`);
@@ -912,14 +986,38 @@ function drawMap() {
         t.textContent = n; t.setAttribute('class', 'node-text');
         
         g.appendChild(c); g.appendChild(t);
-        viewport.appendChild(g);
+        nodeLayer.appendChild(g);
+    }
+}
+
+// Dynamic layers (robot paths + robots); cheap enough to rebuild on every robot_update
+function updateRobotsOnMap() {
+    // Preserve viewport state if dragging
+    if(isDragging) return; 
+
+    clearLayer(pathLayer); clearLayer(robotLayer);
+
+    // 3. Robot Paths (Draw under robots)
+    for(let id in ROBOTS) {
+        const r = ROBOTS[id];
+        if(r.current_path && r.current_path.length > 0) {
+            const rp = px(r.node);
+            let pts = `${rp.x},${rp.y} `;
+            r.current_path.forEach(n => { const p = px(n); pts += `${p.x},${p.y} `; });
+            const line = document.createElementNS('http://www.w3.org/2000/svg','polyline');
+            line.setAttribute('points', pts);
+            line.setAttribute('class', 'robot-path');
+            line.setAttribute('stroke', r.color);
+            pathLayer.appendChild(line);
+        }
     }
 
     // 4. Robots
     for(let id in ROBOTS) {
         const r = ROBOTS[id];
-        const p = nodeToPixel(r.node);
+        const p = px(r.node);
         const g = createGroup(p.x, p.y);
+        originalTransforms[id] = g.getAttribute('transform');
         g.setAttribute('class', 'robot-group');
         g.setAttribute('id', `robot-grp-${id}`);
         
@@ -938,26 +1036,42 @@ function drawMap() {
         t.textContent = id.substring(0,2).toUpperCase(); t.setAttribute('class', 'robot-text');
         
         g.appendChild(c); g.appendChild(t);
-        viewport.appendChild(g);
+        robotLayer.appendChild(g);
     }
 }
 
 // --- Tooltip Logic ---
 function showTooltip(e, html) {
-    tooltip.innerHTML = html;
-    tooltip.style.opacity = 1;
+    // Re-parse only when the content actually changed (e.g. not when re-hovering the same node)
+    if(html !== tooltip._lastHtml) {
+        tooltip.innerHTML = html;
+        tooltip._lastHtml = html;
+    }
+    tooltip.classList.add('visible');
     tooltip.style.left = e.clientX + 'px';
     tooltip.style.top = e.clientY + 'px';
 }
 function hideTooltip() {
-    tooltip.style.opacity = 0;
+    tooltip.classList.remove('visible');
+}
+// Tooltip follows the mouse, but position writes are batched to one per frame
+let tooltipPos = null;
+function moveTooltip(x, y) {
+    const pending = tooltipPos !== null;
+    tooltipPos = {x, y};
+    if(pending) return;
+    requestAnimationFrame(() => {
+        tooltip.style.left = tooltipPos.x + 'px';
+        tooltip.style.top = tooltipPos.y + 'px';
+        tooltipPos = null;
+    });
 }
 
-function createLine(p1, p2, cls) {
+function createLine(p1, p2, cls, parent = edgeLayer) {
     const l = document.createElementNS('http://www.w3.org/2000/svg','line');
     l.setAttribute('x1', p1.x); l.setAttribute('y1', p1.y); l.setAttribute('x2', p2.x); l.setAttribute('y2', p2.y);
     l.setAttribute('class', cls);
-    viewport.appendChild(l);
+    parent.appendChild(l);
 }
 function createGroup(x, y) {
     const g = document.createElementNS('http://www.w3.org/2000/svg','g');
@@ -980,10 +1094,7 @@ window.addEventListener('mousemove', e => {
         transform.x=e.clientX-startDrag.x; transform.y=e.clientY-startDrag.y; updateTransform(); 
     }
     // Move tooltip if visible
-    if(tooltip.style.opacity == 1) {
-        tooltip.style.left = (e.clientX + 15) + 'px';
-        tooltip.style.top = (e.clientY + 15) + 'px';
-    }
+    if(tooltip.classList.contains('visible')) moveTooltip(e.clientX + 15, e.clientY + 15);
 });
 window.addEventListener('mouseup', () => isDragging=false);
 svg.addEventListener('wheel', e => { e.preventDefault(); transform.k *= (1 + (e.deltaY>0?-0.1:0.1)); updateTransform(); });
@@ -992,9 +1103,15 @@ svg.addEventListener('wheel', e => { e.preventDefault(); transform.k *= (1 + (e.
 </html>
 """
 
+# The page has no template variables, so encode it once and let browsers revalidate via ETag
+HTML_PAGE_BYTES = HTML_PAGE.encode('utf-8')
+HTML_PAGE_ETAG = hashlib.md5(HTML_PAGE_BYTES).hexdigest()
+
 @app.route('/')
 def index():
-    return render_template_string(HTML_PAGE)
+    resp = Response(HTML_PAGE_BYTES, mimetype='text/html', headers={'Cache-Control': 'public, max-age=60'})
+    resp.set_etag(HTML_PAGE_ETAG)
+    return resp.make_conditional(request)
 
 # ---------------------------------------------------------
 # 8. Run
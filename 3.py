@@ -1,17 +1,30 @@
 # central_server.py
 # Central planner server for industrial navigation robots
-# Requirements: pip install flask flask-socketio eventlet
+# Requirements: pip install flask flask-socketio eventlet (optional: orjson)
 
 import time
 import uuid
+import hashlib
 import heapq
 import threading
 from collections import deque
-from flask import Flask, request, jsonify, render_template_string
-from flask_socketio import SocketIO
+from flask import Flask, request, jsonify, Response
+from flask_socketio import SocketIO, emit, join_room
+
+try:
+    import orjson
+    def json_dumps(obj): return orjson.dumps(obj).decode('utf-8')
+except ImportError:
+    # Fall back to the stdlib encoder when orjson isn't installed
+    import json
+    def json_dumps(obj): return json.dumps(obj, separators=(',', ':'))
 
 app = Flask(__name__)
 
+# Socket.IO rooms: dashboards get state updates, each robot gets only its own assignments
+DASHBOARD_ROOM = 'dashboards'
+def robot_room(robot_id): return f'robot:{robot_id}'
+
 # Use 'threading' for best compatibility on Windows/Python 3.13
 socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
 
@@ -77,22 +90,48 @@ jobs = {}
 reservations = {}
 state_lock = threading.Lock()
 
+# Serialized state_snapshot, rebuilt only when _state_gen has moved on.
+# Bump _state_gen (under state_lock) after any change to robots/jobs/job_queue.
+_state_gen = 0
+_snapshot_cache = {'json': '', 'gen': -1}
+
+def bump_state():
+    global _state_gen
+    _state_gen += 1
+
+def state_snapshot_json():
+    if _snapshot_cache['gen'] != _state_gen:
+        _snapshot_cache['json'] = json_dumps({'robots': robots, 'jobs': list(jobs.values()), 'queue': job_queue})
+        _snapshot_cache['gen'] = _state_gen
+    return _snapshot_cache['json']
+
 # ----------------------------
 # Utilities: Dijkstra
 # ----------------------------
 def dijkstra(graph, start, end):
     if start == end: return [start]
-    queue = [(0, start, [])]
-    visited = set()
+    # Parent pointers instead of carrying a path list in every heap entry
+    parent = {start: None}
+    dist = {start: 0}
+    counter = 0  # tie-breaker so equal costs never compare node ids
+    queue = [(0, counter, start)]
     while queue:
-        cost, node, path = heapq.heappop(queue)
-        if node in visited: continue
-        visited.add(node)
-        path = path + [node]
-        if node == end: return path
+        cost, _, node = heapq.heappop(queue)
+        if node == end:
+            path = []
+            while node is not None:
+                path.append(node)
+                node = parent[node]
+            path.reverse()
+            return path
+        if cost > dist[node]: continue
         for _, neighbor in graph.get(node, {}).items():
-            if neighbor not in visited:
-                heapq.heappush(queue, (cost + 1, neighbor, path))
+            nc = cost + 1
+            if nc < dist.get(neighbor, float('inf')):
+                dist[neighbor] = nc
+                parent[neighbor] = node
+                counter += 1
+                heapq.heappush(queue, (nc, counter, neighbor))
     return None
 
 # ----------------------------
@@ -119,11 +158,24 @@ def build_coords(graph):
 
 NODE_COORDS = build_coords(GRAPH)
 
+# Dense integer ids for nodes, fixed at startup. Reservations are keyed by these
+# ids so the hot probes hash small ints instead of node strings.
+NODE_LIST = list(GRAPH.keys())
+NODE_IDX = {n: i for i, n in enumerate(NODE_LIST)}
+
+# The layout never changes after startup, so serialize it once for every connect
+LAYOUT_JSON = json_dumps({'nodes': NODE_COORDS, 'graph': GRAPH})
+
+def path_to_idx(path):
+    # Unknown node names (bad robot/job input) map to -1 rather than raising
+    return [NODE_IDX.get(n, -1) for n in path]
+
 # ----------------------------
 # Reservation helpers
 # ----------------------------
 def now_int(): return int(time.time())
 
+# Paths passed to the reservation helpers are node-id lists (see path_to_idx)
 def can_reserve_path(path, start_time_int, robot_id):
     for i, node in enumerate(path):
         t = start_time_int + i
@@ -145,6 +197,9 @@ def release_reservations_of_robot(robot_id):
 # ----------------------------
 def allocator_loop():
     while True:
+        # Dashboard updates are collected under the lock and sent as one batch afterwards
+        pending_emits = []
+        assigned = []
         with state_lock:
             for job in list(job_queue):
                 idle = [r for r, info in robots.items() if info.get('status') == 'idle']
@@ -159,17 +214,19 @@ def allocator_loop():
                     job['status'] = 'failed'
                     job_queue.remove(job)
                     jobs[job['id']] = job
-                    socketio.emit('job_update', {'job': job})
+                    bump_state()
+                    pending_emits.append(('job_update', {'job': dict(job)}))
                     continue
                 
                 combined = path1 + path2[1:]
+                combined_idx = path_to_idx(combined)
                 start_time = now_int()
                 scheduled = False
                 scheduled_start = start_time
                 
                 for offset in range(0, 15): 
-                    if can_reserve_path(combined, start_time + offset, robot_id):
-                        reserve_path(combined, start_time + offset, robot_id)
+                    if can_reserve_path(combined_idx, start_time + offset, robot_id):
+                        reserve_path(combined_idx, start_time + offset, robot_id)
                         scheduled = True
                         scheduled_start = start_time + offset
                         break
@@ -186,9 +243,14 @@ def allocator_loop():
                 
                 robots[robot_id]['status'] = 'busy'
                 robots[robot_id]['current_job'] = job['id']
+                bump_state()
                 
-                socketio.emit('job_assigned', {'robot': robot_id, 'job': job})
-                socketio.emit('job_update', {'job': job})
+                assigned.append({'robot': robot_id, 'job': dict(job)})
+                pending_emits.append(('job_update', {'job': dict(job)}))
+        for a in assigned:
+            socketio.emit('job_assigned', a, to=robot_room(a['robot']))
+        if pending_emits:
+            socketio.emit('batch_update', {'updates': pending_emits}, to=DASHBOARD_ROOM)
         time.sleep(1.0)
 
 alloc_thread = threading.Thread(target=allocator_loop, daemon=True)
@@ -198,7 +260,12 @@ alloc_thread.start()
 # HTTP endpoints
 # ----------------------------
 @app.route('/')
-def index(): return render_template_string(HTML_PAGE)
+def index():
+    # make_conditional matches quoted, weak and list forms of If-None-Match and
+    # answers 304 with the ETag and Cache-Control headers still set
+    resp = Response(HTML_PAGE_BYTES, mimetype='text/html', headers={'Cache-Control': 'public, max-age=60'})
+    resp.set_etag(HTML_PAGE_ETAG)
+    return resp.make_conditional(request)
 
 @app.route('/submit_job', methods=['POST'])
 def submit_job():
@@ -211,7 +278,8 @@ def submit_job():
     with state_lock:
         job_queue.append(job)
         jobs[job_id] = job
-    socketio.emit('job_update', {'job': job})
+        bump_state()
+    socketio.emit('job_update', {'job': job}, to=DASHBOARD_ROOM)
     return jsonify({'job_id': job_id}), 200
 
 @app.route('/register_robot', methods=['POST'])
@@ -222,7 +290,8 @@ def register_robot():
     direction = data.get('direction') or 's'
     with state_lock:
         robots[robot_id] = {'status': 'idle', 'node': node, 'dir': direction, 'last_seen': time.time()}
-    socketio.emit('robot_update', {'robot': robot_id, 'info': robots[robot_id]})
+        bump_state()
+    socketio.emit('robot_update', {'robot': robot_id, 'info': robots[robot_id]}, to=DASHBOARD_ROOM)
     return jsonify({'robot_id': robot_id}), 200
 
 @app.route('/poll_task', methods=['GET'])
@@ -238,6 +307,7 @@ def poll_task():
             if job.get('assigned_robot') == robot_id and job.get('status') == 'assigned':
                 robots[robot_id]['current_job'] = job['id']
                 robots[robot_id]['status'] = 'busy'
+                bump_state()
                 return jsonify({'job': job}), 200
     return jsonify({'job': None}), 200
 
@@ -251,26 +321,37 @@ def update_location():
         if robot_id not in robots: return jsonify({'error': 'unknown'}), 400
         robots[robot_id]['node'] = node
         robots[robot_id]['last_seen'] = time.time()
+        bump_state()
         if status == 'job_done':
             cur_job = robots[robot_id].get('current_job')
             if cur_job:
                 jobs[cur_job]['status'] = 'done'
                 jobs[cur_job]['completed_ts'] = time.time()
-                socketio.emit('job_update', {'job': jobs[cur_job]})
+                socketio.emit('job_update', {'job': jobs[cur_job]}, to=DASHBOARD_ROOM)
                 robots[robot_id].pop('current_job', None)
             robots[robot_id]['status'] = 'idle'
             release_reservations_of_robot(robot_id)
-        socketio.emit('robot_update', {'robot': robot_id, 'info': robots[robot_id]})
+        socketio.emit('robot_update', {'robot': robot_id, 'info': robots[robot_id]}, to=DASHBOARD_ROOM)
     return jsonify({'ok': True}), 200
 
 # ----------------------------
 # Socket Events
 # ----------------------------
 @socketio.on('connect')
-def on_connect():
+def on_connect(auth=None):
+    # Robot clients identify themselves with io(url, {auth: {robot_id}}) and only
+    # join their own room; everything else is treated as a dashboard.
+    robot_id = (auth or {}).get('robot_id') if isinstance(auth, dict) else None
+    if robot_id:
+        join_room(robot_room(robot_id))
+        return
+    join_room(DASHBOARD_ROOM)
+    # Initial state goes to the connecting dashboard only, not to every client.
+    # The layout is immutable and pre-serialized, so it needs no lock.
+    emit('layout', LAYOUT_JSON)
     with state_lock:
-        socketio.emit('layout', {'nodes': NODE_COORDS, 'graph': GRAPH})
-        socketio.emit('state_snapshot', {'robots': robots, 'jobs': list(jobs.values()), 'queue': job_queue})
+        snapshot = state_snapshot_json()
+    emit('state_snapshot', snapshot)
 
 # ----------------------------
 # DASHBOARD HTML (Industrial Style)
@@ -320,6 +401,9 @@ HTML_PAGE = """
     .status-badge { font-size: 0.7rem; padding: 4px 8px; border-radius: 12px; font-weight: 600; }
     .status-idle { background: #e9ecef; color: #495057; }
     .status-busy { background: #cfe2ff; color: #084298; }
+    .vlist { position: relative; overflow-y: auto; height: 320px; }
+    .vlist-window { position: absolute; top: 0; left: 0; right: 0; will-change: transform; }
+    .vlist-window > .list-item { height: 64px; box-sizing: border-box; overflow: hidden; }
 
     @media (max-width: 1200px) { .dashboard-grid { grid-template-columns: 1fr 1fr; grid-template-rows: auto auto; height: auto; } .map-card { grid-column: 1 / -1; height: 500px; } }
     @media (max-width: 768px) { .dashboard-grid { grid-template-columns: 1fr; } }
@@ -357,18 +441,18 @@ HTML_PAGE = """
             <button class="btn btn-sm btn-outline-secondary" onclick="resetView()">Recenter</button>
         </div>
         <div class="map-container" id="mapwrap">
-            <svg id="map" width="100%" height="100%"><g id="viewport"></g></svg>
+            <svg id="map" width="100%" height="100%"><g id="viewport"><g id="grid"></g><g id="scene"></g></g></svg>
         </div>
     </div>
 
     <div class="d-flex flex-column gap-3">
         <div class="card flex-grow-1">
             <div class="card-header"><i class="bi bi-robot"></i> Robots</div>
-            <div class="card-body p-0" id="robots-list"><div class="p-3 text-center text-muted small">No robots</div></div>
+            <div class="card-body p-0 vlist" id="robots-list"></div>
         </div>
         <div class="card flex-grow-1">
             <div class="card-header"><i class="bi bi-list-check"></i> Jobs</div>
-            <div class="card-body p-0" id="jobs-list"><div class="p-3 text-center text-muted small">Queue empty</div></div>
+            <div class="card-body p-0 vlist" id="jobs-list"></div>
         </div>
     </div>
   </div>
@@ -377,38 +461,87 @@ HTML_PAGE = """
 const socket = io();
 let NODE_COORDS = {}, GRAPH_DATA = {}, ROBOTS = {}, JOBS = {};
 const viewport = document.getElementById('viewport');
+const gridLayer = document.getElementById('grid');
+const scene = document.getElementById('scene');
+const GRID_BOUNDS = {maxX: 0, maxY: 0};
 const scaleFactor = 40; 
 const offsetX = 100, offsetY = 100; 
 let transform = { x: 0, y: 0, k: 1 }; 
 let isDragging = false, startDrag = { x: 0, y: 0 };
 
 socket.on('connect', () => console.log('Connected'));
-socket.on('layout', d => { NODE_COORDS = d.nodes; GRAPH_DATA = d.graph; drawMap(); });
-socket.on('state_snapshot', d => { ROBOTS = d.robots || {}; JOBS = {}; (d.jobs||[]).forEach(j=>JOBS[j.id]=j); updateUI(); });
-socket.on('robot_update', d => { ROBOTS[d.robot] = d.info; updateUI(); });
-socket.on('job_update', d => { JOBS[d.job.id] = d.job; updateUI(); });
+socket.on('layout', raw => {
+    const d = typeof raw === 'string' ? JSON.parse(raw) : raw;
+    NODE_COORDS = d.nodes; GRAPH_DATA = d.graph;
+    GRID_BOUNDS.maxX = 0; GRID_BOUNDS.maxY = 0;
+    for(let n in d.nodes) {
+        if(d.nodes[n][0] > GRID_BOUNDS.maxX) GRID_BOUNDS.maxX = d.nodes[n][0];
+        if(d.nodes[n][1] > GRID_BOUNDS.maxY) GRID_BOUNDS.maxY = d.nodes[n][1];
+    }
+    initMap(); drawMap();
+});
+socket.on('state_snapshot', raw => { const d = typeof raw === 'string' ? JSON.parse(raw) : raw; ROBOTS = d.robots || {}; JOBS = {}; (d.jobs||[]).forEach(j=>JOBS[j.id]=j); updateUI(); });
+const UPDATE_HANDLERS = {
+    robot_update: d => { ROBOTS[d.robot] = d.info; },
+    job_update: d => { JOBS[d.job.id] = d.job; },
+};
+// Coalesce bursts of updates into a single repaint per animation frame
+let uiDirty = false;
+function scheduleUI() {
+    if(uiDirty) return;
+    uiDirty = true;
+    requestAnimationFrame(() => { updateUI(); uiDirty = false; });
+}
+socket.on('robot_update', d => { UPDATE_HANDLERS.robot_update(d); scheduleUI(); });
+socket.on('job_update', d => { UPDATE_HANDLERS.job_update(d); scheduleUI(); });
+socket.on('batch_update', d => {
+    (d.updates || []).forEach(([ev, payload]) => { if(UPDATE_HANDLERS[ev]) UPDATE_HANDLERS[ev](payload); });
+    scheduleUI();
+});
+
+// Windowed list: only the rows inside the scroll viewport exist in the DOM
+const ROW_HEIGHT = 64;
+function virtualList(container, renderRow, emptyHtml) {
+    const spacer = document.createElement('div');
+    const win = document.createElement('div');
+    win.className = 'vlist-window';
+    container.appendChild(spacer); container.appendChild(win);
+    let items = [], pending = false;
+    function render() {
+        pending = false;
+        if(!items.length) { spacer.style.height = '0px'; win.style.transform = ''; win.innerHTML = emptyHtml; return; }
+        const first = Math.floor(container.scrollTop / ROW_HEIGHT);
+        const last = Math.min(items.length, first + Math.ceil(container.clientHeight / ROW_HEIGHT) + 1);
+        spacer.style.height = (items.length * ROW_HEIGHT) + 'px';
+        win.style.transform = `translateY(${first * ROW_HEIGHT}px)`;
+        let html = '';
+        for(let i = first; i < last; i++) html += renderRow(items[i]);
+        win.innerHTML = html;
+    }
+    container.addEventListener('scroll', () => { if(pending) return; pending = true; requestAnimationFrame(render); });
+    return { setItems(list) { items = list; render(); } };
+}
+
+const robotsView = virtualList(document.getElementById('robots-list'), ([id, r]) => {
+    const cls = r.status === 'busy' ? 'status-busy' : 'status-idle';
+    return `<div class="list-item d-flex justify-content-between align-items-center">
+        <div><div class="fw-bold small">${id.substring(0,6)}</div><div class="text-muted small">Node ${r.node}</div></div>
+        <span class="status-badge ${cls}">${r.status}</span></div>`;
+}, '<div class="p-3 text-center text-muted small">No robots</div>');
+
+const jobsView = virtualList(document.getElementById('jobs-list'), j =>
+    `<div class="list-item"><div class="d-flex justify-content-between">
+        <span class="fw-bold small">#${j.id}</span><span class="badge bg-secondary small">${j.status}</span>
+        </div><div class="small text-muted">${j.pickup} -> ${j.drop}</div></div>`,
+    '<div class="p-3 text-center text-muted small">Queue empty</div>');
 
 function updateUI() {
+    const active = Object.values(JOBS).filter(j => j.status !== 'done');
     document.getElementById('stat-robots').innerText = Object.keys(ROBOTS).length;
-    document.getElementById('stat-jobs').innerText = Object.values(JOBS).filter(j => j.status !== 'done').length;
-    
-    const rList = document.getElementById('robots-list');
-    rList.innerHTML = '';
-    for(let id in ROBOTS) {
-        const r = ROBOTS[id];
-        const cls = r.status === 'busy' ? 'status-busy' : 'status-idle';
-        rList.innerHTML += `<div class="list-item d-flex justify-content-between align-items-center">
-            <div><div class="fw-bold small">${id.substring(0,6)}</div><div class="text-muted small">Node ${r.node}</div></div>
-            <span class="status-badge ${cls}">${r.status}</span></div>`;
-    }
+    document.getElementById('stat-jobs').innerText = active.length;
     
-    const jList = document.getElementById('jobs-list');
-    jList.innerHTML = '';
-    Object.values(JOBS).filter(j => j.status !== 'done').forEach(j => {
-        jList.innerHTML += `<div class="list-item"><div class="d-flex justify-content-between">
-            <span class="fw-bold small">#${j.id}</span><span class="badge bg-secondary small">${j.status}</span>
-            </div><div class="small text-muted">${j.pickup} -> ${j.drop}</div></div>`;
-    });
+    robotsView.setItems(Object.entries(ROBOTS));
+    jobsView.setItems(active);
     
     drawMap();
 }
@@ -419,16 +552,17 @@ function nodeToPixel(nId) {
     return n ? {x: offsetX + n[0]*scaleFactor, y: offsetY + n[1]*scaleFactor} : {x:0,y:0};
 }
 
+// Static grid: built once per layout event, drawMap never touches it
+function initMap() {
+    while (gridLayer.firstChild) gridLayer.removeChild(gridLayer.firstChild);
+    if(!Object.keys(NODE_COORDS).length) return;
+    const maxX = GRID_BOUNDS.maxX, maxY = GRID_BOUNDS.maxY;
+    for(let x=0; x<=maxX+1; x++) createLine({x: offsetX+x*scaleFactor, y: offsetY}, {x: offsetX+x*scaleFactor, y: offsetY+(maxY+1)*scaleFactor}, 'grid-line', gridLayer);
+    for(let y=0; y<=maxY+1; y++) createLine({x: offsetX, y: offsetY+y*scaleFactor}, {x: offsetX+(maxX+1)*scaleFactor, y: offsetY+y*scaleFactor}, 'grid-line', gridLayer);
+}
+
 function drawMap() {
-    while (viewport.firstChild) viewport.removeChild(viewport.firstChild);
-    
-    // Grid
-    if(Object.keys(NODE_COORDS).length) {
-        let maxX=0, maxY=0;
-        for(let n in NODE_COORDS) { maxX = Math.max(maxX, NODE_COORDS[n][0]); maxY = Math.max(maxY, NODE_COORDS[n][1]); }
-        for(let x=0; x<=maxX+1; x++) createLine({x: offsetX+x*scaleFactor, y: offsetY}, {x: offsetX+x*scaleFactor, y: offsetY+(maxY+1)*scaleFactor}, 'grid-line');
-        for(let y=0; y<=maxY+1; y++) createLine({x: offsetX, y: offsetY+y*scaleFactor}, {x: offsetX+(maxX+1)*scaleFactor, y: offsetY+y*scaleFactor}, 'grid-line');
-    }
+    while (scene.firstChild) scene.removeChild(scene.firstChild);
 
     // Edges
     for(let u in GRAPH_DATA) {
@@ -448,7 +582,7 @@ function drawMap() {
         const t = document.createElementNS('http://www.w3.org/2000/svg','text');
         t.textContent = n; t.setAttribute('class', 'node-text');
         g.appendChild(c); g.appendChild(t);
-        viewport.appendChild(g);
+        scene.appendChild(g);
     }
 
     // Robots
@@ -463,16 +597,16 @@ function drawMap() {
         const t = document.createElementNS('http://www.w3.org/2000/svg','text');
         t.textContent = id.substring(0,2); t.setAttribute('class', 'robot-text');
         g.appendChild(r); g.appendChild(t);
-        viewport.appendChild(g);
+        scene.appendChild(g);
     }
 }
 
-function createLine(p1, p2, cls) {
+function createLine(p1, p2, cls, parent = scene) {
     const l = document.createElementNS('http://www.w3.org/2000/svg','line');
     l.setAttribute('x1', p1.x); l.setAttribute('y1', p1.y);
     l.setAttribute('x2', p2.x); l.setAttribute('y2', p2.y);
     l.setAttribute('class', cls);
-    viewport.appendChild(l);
+    parent.appendChild(l);
 }
 function createGroup(x, y) {
     const g = document.createElementNS('http://www.w3.org/2000/svg','g');
@@ -499,6 +633,10 @@ setInterval(() => document.getElementById('svtime').innerText = new Date().toLoc
 </html>
 """
 
+# Static page (no template variables): encode once at import time
+HTML_PAGE_BYTES = HTML_PAGE.encode('utf-8')
+HTML_PAGE_ETAG = hashlib.md5(HTML_PAGE_BYTES).hexdigest()
+
 if __name__ == '__main__':
     print("Server running on port 5000...")
     socketio.run(app, host='0.0.0.0', port=5000)
\ No newline at end of file
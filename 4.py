@@ -1,20 +1,47 @@
 # central_server.py
 # Central planner server for industrial navigation robots
-# Requirements: pip install flask flask-socketio
+# Requirements: pip install flask flask-socketio (optional: orjson)
 
+import json
 import time
 import uuid
-import heapq
 import threading
-import random
+import itertools
 from collections import deque
-from flask import Flask, request, jsonify, render_template_string
-from flask_socketio import SocketIO
+from contextlib import ExitStack
+from flask import Flask, request, jsonify, Response
+from flask.json.provider import DefaultJSONProvider
+from flask_socketio import SocketIO, emit, join_room
+
+try:
+    import orjson
+    def json_dumps(obj, **kwargs): return orjson.dumps(obj).decode('utf-8')
+    json_loads = orjson.loads
+except ImportError:
+    orjson = None
+    # Fall back to the stdlib encoder when orjson isn't installed
+    def json_dumps(obj, **kwargs): return json.dumps(obj, separators=(',', ':'))
+    json_loads = json.loads
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by json_dumps/json_loads (orjson when available)."""
+    def dumps(self, obj, **kwargs): return json_dumps(obj)
+    def loads(self, s, **kwargs): return json_loads(s)
+
+class SocketJSON:
+    """json-module shim for python-socketio, which calls dumps(obj, separators=...)."""
+    dumps = staticmethod(json_dumps)
+    loads = staticmethod(json_loads)
 
 app = Flask(__name__)
+if orjson is not None: app.json = FastJSONProvider(app)
+
+# Socket.IO rooms: dashboards get state updates, each robot gets only its own tasks
+DASHBOARD_ROOM = 'dashboards'
+def robot_room(robot_id): return f'robot:{robot_id}'
 
 # Use 'threading' for best compatibility on Windows/Python 3.13
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading', json=SocketJSON)
 
 # ----------------------------
 # Configuration & Graph
@@ -68,33 +95,76 @@ GRAPH = {
 # Time and reservation settings
 TIME_STEP = 1.0
 RESERVATION_LOOKAHEAD = 300
+RESERVATION_GC_EVERY = 10  # allocator passes between stale-reservation sweeps
+RESERVATION_GC_SLACK = 5   # seconds of past reservations kept around
+RESERVE_WINDOW = 15        # start offsets (seconds) the allocator tries per job
 
 # ----------------------------
 # In-memory state
 # ----------------------------
-robots = {}     # robot_id -> {status, node, color, current_path: []}
-job_queue = []  # Pending jobs
+robots = {}     # robot_id -> {status, node, color, current_path: [], path_idx}
+job_queue = deque()  # Pending jobs, FIFO
 jobs = {}       # All jobs (including done)
-reservations = {}
-state_lock = threading.Lock()
+job_ids = itertools.count(1)  # next() is atomic under the GIL, so no lock needed
+reservations = {}        # node idx -> {t: robot_id}
+robot_reservations = {}  # robot_id -> [(node idx, t), ...] so a robot's slots can be freed directly
+# Per-resource locks. Whenever more than one is needed they are taken in
+# the order jobs -> robots -> reservations so two threads can never deadlock.
+jobs_lock = threading.Lock()          # job_queue, jobs
+robots_lock = threading.Lock()        # robots
+reservations_lock = threading.Lock()  # reservations, robot_reservations
+# Set whenever a job is queued or a robot becomes idle so the allocator runs now
+# rather than on its next timeout.
+alloc_event = threading.Event()
+ALLOC_IDLE_TIMEOUT = 5.0  # seconds; still retries unscheduled jobs without a trigger
+
+# ----------------------------
+# Integer node ids
+# ----------------------------
+# Internally nodes are 0..N-1 with list-indexed adjacency; names are only used
+# at the API boundary (requests in, socket payloads out).
+NODE_LIST = list(GRAPH)                           # idx -> node name
+NODE2IDX = {n: i for i, n in enumerate(NODE_LIST)}  # node name -> idx
+ADJ = [[NODE2IDX[v] for v in GRAPH[n].values()] for n in NODE_LIST]
+
+def idx_path_to_names(path):
+    return [NODE_LIST[i] for i in path]
 
 # ----------------------------
-# Utilities: Dijkstra
+# Utilities: All-pairs shortest paths
 # ----------------------------
-def dijkstra(graph, start, end):
+# The graph is static and unweighted, so one BFS per node at startup gives every
+# shortest path; the allocator then does table lookups instead of searches.
+# Only the BFS parent pointers are stored; a path is walked out once on lookup.
+def bfs_parents(src):
+    parent = [-1] * len(ADJ)
+    parent[src] = src
+    q = deque([src])
+    while q:
+        u = q.popleft()
+        for v in ADJ[u]:
+            if parent[v] < 0:
+                parent[v] = u
+                q.append(v)
+    return parent
+
+ALL_PAIRS = [bfs_parents(i) for i in range(len(NODE_LIST))]  # src idx -> parent idx per dst (-1 = unreachable)
+
+def reachable(start, end):
+    # O(1) feasibility check straight from the BFS table, no path built
+    return ALL_PAIRS[start][end] >= 0
+
+def shortest_path(start, end):
+    # start/end are node indices; returns a list of indices or None
     if start == end: return [start]
-    queue = [(0, start, [])]
-    visited = set()
-    while queue:
-        cost, node, path = heapq.heappop(queue)
-        if node in visited: continue
-        visited.add(node)
-        path = path + [node]
-        if node == end: return path
-        for _, neighbor in graph.get(node, {}).items():
-            if neighbor not in visited:
-                heapq.heappush(queue, (cost + 1, neighbor, path))
-    return None
+    parent = ALL_PAIRS[start]
+    if parent[end] < 0: return None
+    path = [end]
+    while end != start:
+        end = parent[end]
+        path.append(end)
+    path.reverse()
+    return path
 
 # ----------------------------
 # Layout: ABSOLUTE COORDINATES extraction
@@ -102,78 +172,125 @@ def dijkstra(graph, start, end):
 def build_coords(graph):
     coords = {}
     for node in graph:
-        try:
-            r = int(node[0])
-            c = int(node[1])
+        # Names are two ASCII digits "RC"; ord() avoids int() parsing per char
+        r = ord(node[0]) - 48 if node else -1
+        c = ord(node[1]) - 48 if len(node) > 1 else -1
+        if 0 <= r <= 9 and 0 <= c <= 9:
             coords[node] = (c, r) # x=c, y=r
-        except:
+        else:
             coords[node] = (0, 0)
     return coords
 
 NODE_COORDS = build_coords(GRAPH)
+# Layout never changes, so serialize it once instead of on every connect
+LAYOUT_JSON = json_dumps({'nodes': NODE_COORDS, 'graph': GRAPH})
 
 # ----------------------------
 # Reservation helpers
 # ----------------------------
 def now_int(): return int(time.time())
 
-def can_reserve_path(path, start_time_int, robot_id):
-    for i, node in enumerate(path):
-        t = start_time_int + i
-        if (node, t) in reservations and reservations[(node, t)] != robot_id:
-            return False
-    return True
+# Reservations are stored per node as {t: robot_id}; paths here are index lists
+def first_free_offset(path, start_time_int, robot_id, window=RESERVE_WINDOW):
+    # Bit j of `clash` is set when starting at start_time_int + j would hit a slot
+    # held by another robot. Each node's (small, pruned) slot dict is walked once
+    # for all offsets instead of probing it once per offset; the lowest clear bit
+    # is the earliest start. Returns None if every offset in the window clashes.
+    clash = 0
+    get_slots = reservations.get
+    for t0, node in enumerate(path, start_time_int):
+        slots = get_slots(node)
+        if not slots: continue
+        for t, owner in slots.items():
+            j = t - t0
+            if 0 <= j < window and owner != robot_id:
+                clash |= 1 << j
+    offset = (~clash & (clash + 1)).bit_length() - 1
+    return offset if offset < window else None
 
 def reserve_path(path, start_time_int, robot_id):
+    held = robot_reservations.setdefault(robot_id, [])
     for i, node in enumerate(path):
         t = start_time_int + i
-        reservations[(node, t)] = robot_id
+        reservations.setdefault(node, {})[t] = robot_id
+        held.append((node, t))
 
 def release_reservations_of_robot(robot_id):
-    keys = [k for k, v in reservations.items() if v == robot_id]
-    for k in keys: del reservations[k]
-
-def generate_random_color():
-    return "#{:06x}".format(random.randint(0, 0xFFFFFF))
+    # O(robot's own path) instead of scanning every reservation in the system
+    for node, t in robot_reservations.pop(robot_id, []):
+        slots = reservations.get(node)
+        if slots and slots.get(t) == robot_id:
+            del slots[t]
+
+def prune_reservations(cutoff):
+    # Drop every slot whose time has passed; nothing ever reads them again
+    for node in list(reservations):
+        slots = reservations[node]
+        for t in [t for t in slots if t < cutoff]:
+            del slots[t]
+        if not slots:
+            del reservations[node]
+    for rid, held in robot_reservations.items():
+        robot_reservations[rid] = [(n, t) for n, t in held if t >= cutoff]
+
+# Fixed robot palette: Knuth multiplicative hash spreads consecutive indices
+# across the colour space without touching the RNG (index 0 would be black).
+COLORS = ['#%06x' % ((i * 2654435761) & 0xFFFFFF) for i in range(1, 257)]
+
+def robot_color(n):
+    return COLORS[n % len(COLORS)]
 
 # ----------------------------
 # Job allocator thread
 # ----------------------------
 def allocator_loop():
+    passes = 0
     while True:
-        with state_lock:
-            # Only look at queued jobs
-            pending = [j for j in job_queue if j['status'] == 'queued']
+        passes += 1
+        # One clock read per pass so every job and offset is scheduled against the same base time
+        base_t = now_int()
+        if passes % RESERVATION_GC_EVERY == 0:
+            with reservations_lock:
+                prune_reservations(base_t - RESERVATION_GC_SLACK)
+
+        # Dashboard updates are collected under the locks and sent as one batch
+        # afterwards; payloads are shallow copies so they can be encoded unlocked.
+        pending_emits = []
+        assigned = []
+        with jobs_lock, robots_lock, reservations_lock:
+            # Jobs that could not be scheduled this pass; they go back to the
+            # head of the queue so FIFO order is kept.
+            retry = deque()
             
-            for job in pending:
+            while job_queue:
                 idle = [r for r, info in robots.items() if info.get('status') == 'idle']
                 if not idle: break
                 
+                job = job_queue.popleft()
                 robot_id = idle[0]
                 robot_info = robots[robot_id]
                 start_node = robot_info.get('node', '81')
                 
-                path1 = dijkstra(GRAPH, start_node, job['pickup'])
-                path2 = dijkstra(GRAPH, job['pickup'], job['drop'])
-                
-                if not path1 or not path2:
+                start_idx = NODE2IDX.get(start_node)
+                pickup_idx = NODE2IDX.get(job['pickup'])
+                drop_idx = NODE2IDX.get(job['drop'])
+                # Reject unknown or unreachable endpoints before building any path
+                if (start_idx is None or pickup_idx is None or drop_idx is None
+                        or not reachable(start_idx, pickup_idx) or not reachable(pickup_idx, drop_idx)):
                     job['status'] = 'failed'
-                    socketio.emit('job_update', {'job': job})
+                    pending_emits.append(('job_update', {'job': dict(job)}))
                     continue
                 
-                combined = path1 + path2[1:]
-                start_time = now_int()
-                scheduled = False
-                scheduled_start = start_time
-                
-                for offset in range(0, 15): 
-                    if can_reserve_path(combined, start_time + offset, robot_id):
-                        reserve_path(combined, start_time + offset, robot_id)
-                        scheduled = True
-                        scheduled_start = start_time + offset
-                        break
-                
-                if not scheduled: continue
+                path1 = shortest_path(start_idx, pickup_idx)
+                path2 = shortest_path(pickup_idx, drop_idx)
+                combined_idx = path1 + path2[1:]
+                combined = idx_path_to_names(combined_idx)
+                offset = first_free_offset(combined_idx, base_t, robot_id)
+                if offset is None:
+                    retry.append(job)
+                    continue
+                scheduled_start = base_t + offset
+                reserve_path(combined_idx, scheduled_start, robot_id)
                 
                 # Assign
                 job['assigned_robot'] = robot_id
@@ -186,15 +303,23 @@ def allocator_loop():
                 robots[robot_id]['status'] = 'busy'
                 robots[robot_id]['current_job'] = job['id']
                 robots[robot_id]['current_path'] = combined # Store full path for visualization
+                robots[robot_id]['path_idx'] = 0             # Index of the robot's node in current_path
                 
-                # Remove from pending queue, but keep in global dict
-                job_queue.remove(job)
-                
-                socketio.emit('job_assigned', {'robot': robot_id, 'job': job})
-                socketio.emit('job_update', {'job': job})
-                socketio.emit('robot_update', {'robot': robot_id, 'info': robots[robot_id]})
+                # One entry carries both the job and the robot it went to
+                job_copy = dict(job)
+                pending_emits.append(('job_assigned', {'robot': robot_id, 'info': dict(robots[robot_id]), 'job': job_copy}))
+                assigned.append((robot_id, job_copy))
+            
+            job_queue.extendleft(reversed(retry))
         
-        time.sleep(1.0)
+        # Push assignments straight to the robots instead of waiting for them to poll
+        for robot_id, job in assigned:
+            socketio.emit('task', job, to=robot_room(robot_id))
+        if pending_emits:
+            socketio.emit('batch_update', {'updates': pending_emits}, to=DASHBOARD_ROOM)
+        
+        alloc_event.wait(timeout=ALLOC_IDLE_TIMEOUT)
+        alloc_event.clear()
 
 alloc_thread = threading.Thread(target=allocator_loop, daemon=True)
 alloc_thread.start()
@@ -203,7 +328,7 @@ alloc_thread.start()
 # HTTP endpoints
 # ----------------------------
 @app.route('/')
-def index(): return render_template_string(HTML_PAGE)
+def index(): return Response(HTML_PAGE_BYTES, mimetype='text/html')
 
 @app.route('/submit_job', methods=['POST'])
 def submit_job():
@@ -211,12 +336,13 @@ def submit_job():
     pickup = data.get('pickup')
     drop = data.get('drop')
     if not pickup or not drop: return jsonify({'error': 'required'}), 400
-    job_id = str(uuid.uuid4())[:8]
+    job_id = f'j{next(job_ids):06x}'
     job = {'id': job_id, 'pickup': pickup, 'drop': drop, 'submitted_ts': time.time(), 'status': 'queued', 'assigned_robot': None}
-    with state_lock:
+    with jobs_lock:
         job_queue.append(job)
         jobs[job_id] = job
-    socketio.emit('job_update', {'job': job})
+    alloc_event.set()
+    socketio.emit('job_update', {'job': job}, to=DASHBOARD_ROOM)
     return jsonify({'job_id': job_id}), 200
 
 @app.route('/register_robot', methods=['POST'])
@@ -226,10 +352,9 @@ def register_robot():
     node = data.get('node') or '81'
     direction = data.get('direction') or 's'
     
-    # Generate random color if new
-    color = generate_random_color()
-    
-    with state_lock:
+    with robots_lock:
+        # Pick the next palette colour if new
+        color = robot_color(len(robots))
         if robot_id in robots:
             color = robots[robot_id].get('color', color)
             
@@ -239,22 +364,30 @@ def register_robot():
             'dir': direction, 
             'last_seen': time.time(),
             'color': color,
-            'current_path': []
+            'current_path': [],
+            'path_idx': 0
         }
-    socketio.emit('robot_update', {'robot': robot_id, 'info': robots[robot_id]})
+    alloc_event.set()
+    socketio.emit('robot_update', {'robot': robot_id, 'info': robots[robot_id]}, to=DASHBOARD_ROOM)
     return jsonify({'robot_id': robot_id, 'color': color}), 200
 
 @app.route('/poll_task', methods=['GET'])
 def poll_task():
+    # Deprecated: robots should connect over Socket.IO with auth={'robot_id': ...}
+    # and listen for 'task'. Kept so older clients keep working.
     robot_id = request.args.get('robot_id')
     if not robot_id: return jsonify({'error': 'id req'}), 400
-    with state_lock:
-        if robot_id not in robots: return jsonify({'error': 'unknown robot'}), 400
-        robots[robot_id]['last_seen'] = time.time()
-        cur_job_id = robots[robot_id].get('current_job')
-        
-        if cur_job_id: return jsonify({'job': jobs.get(cur_job_id)}), 200
-        return jsonify({'job': None}), 200
+    info = robots.get(robot_id)
+    if info is None: return jsonify({'error': 'unknown robot'}), 400
+    # A single float store; a racing reader sees either timestamp, so no lock.
+    info['last_seen'] = time.time()
+    with robots_lock:
+        cur_job_id = info.get('current_job')
+    
+    if cur_job_id:
+        with jobs_lock:
+            return jsonify({'job': jobs.get(cur_job_id)}), 200
+    return jsonify({'job': None}), 200
 
 @app.route('/update_location', methods=['POST'])
 def update_location():
@@ -262,43 +395,62 @@ def update_location():
     robot_id = data.get('robot_id')
     node = data.get('node')
     status = data.get('status')
-    with state_lock:
+    # Only a finished job touches jobs and reservations; plain moves just need robots.
+    locks = (jobs_lock, robots_lock, reservations_lock) if status == 'job_done' else (robots_lock,)
+    with ExitStack() as stack:
+        for lock in locks: stack.enter_context(lock)
         if robot_id not in robots: return jsonify({'error': 'unknown'}), 400
         
         robots[robot_id]['node'] = node
         robots[robot_id]['last_seen'] = time.time()
         
-        # PATH CONSUMPTION LOGIC: Remove nodes from path as they are reached
-        if 'current_path' in robots[robot_id]:
-            path = robots[robot_id]['current_path']
-            if node in path:
-                # Slice path to keep only nodes from current location onwards
-                idx = path.index(node)
-                robots[robot_id]['current_path'] = path[idx:]
+        # PATH CONSUMPTION LOGIC: advance path_idx to the reached node instead of
+        # re-slicing the path; robots move forward, so this is usually one step.
+        path = robots[robot_id].get('current_path')
+        if path:
+            idx = robots[robot_id].get('path_idx', 0)
+            while idx < len(path) and path[idx] != node: idx += 1
+            if idx < len(path): robots[robot_id]['path_idx'] = idx
         
         if status == 'job_done':
             cur_job = robots[robot_id].get('current_job')
             if cur_job:
                 jobs[cur_job]['status'] = 'done'
                 jobs[cur_job]['completed_ts'] = time.time()
-                socketio.emit('job_update', {'job': jobs[cur_job]})
+                socketio.emit('job_update', {'job': jobs[cur_job]}, to=DASHBOARD_ROOM)
                 robots[robot_id].pop('current_job', None)
             
             robots[robot_id]['status'] = 'idle'
             robots[robot_id]['current_path'] = [] # Clear path
+            robots[robot_id]['path_idx'] = 0
             release_reservations_of_robot(robot_id)
             
-        socketio.emit('robot_update', {'robot': robot_id, 'info': robots[robot_id]})
+        socketio.emit('robot_update', {'robot': robot_id, 'info': robots[robot_id]}, to=DASHBOARD_ROOM)
+    if status == 'job_done': alloc_event.set()
     return jsonify({'ok': True}), 200
 
 # ----------------------------
 # Socket Events
 # ----------------------------
 @socketio.on('connect')
-def on_connect():
-    with state_lock:
-        socketio.emit('layout', {'nodes': NODE_COORDS, 'graph': GRAPH})
-        socketio.emit('state_snapshot', {'robots': robots, 'jobs': list(jobs.values())})
+def on_connect(auth=None):
+    # Robot clients identify themselves with io(url, {auth: {robot_id}}) and only
+    # join their own room; everything else is treated as a dashboard.
+    robot_id = (auth or {}).get('robot_id') if isinstance(auth, dict) else None
+    if robot_id:
+        join_room(robot_room(robot_id))
+        # Re-deliver an in-flight task after a reconnect
+        with jobs_lock, robots_lock:
+            cur_job_id = robots.get(robot_id, {}).get('current_job')
+            job = jobs.get(cur_job_id) if cur_job_id else None
+            if job: emit('task', job)
+        return
+    join_room(DASHBOARD_ROOM)
+    # Initial state goes to the connecting dashboard only, not to every client.
+    # The layout is immutable and pre-serialized, so it needs no lock.
+    emit('layout', LAYOUT_JSON)
+    with jobs_lock, robots_lock:
+        emit('state_snapshot', {'robots': robots, 'jobs': list(jobs.values())})
 
 # ----------------------------
 # DASHBOARD HTML
@@ -406,15 +558,27 @@ let transform = { x: 0, y: 0, k: 1 };
 let isDragging = false, startDrag = { x: 0, y: 0 };
 
 socket.on('connect', () => console.log('Connected'));
-socket.on('layout', d => { NODE_COORDS = d.nodes; GRAPH_DATA = d.graph; drawMap(); });
+socket.on('layout', raw => {
+    const d = typeof raw === 'string' ? JSON.parse(raw) : raw;
+    NODE_COORDS = d.nodes; GRAPH_DATA = d.graph; drawMap();
+});
 socket.on('state_snapshot', d => { 
     ROBOTS = d.robots || {}; 
     JOBS = {}; 
     (d.jobs||[]).forEach(j=>JOBS[j.id]=j); 
     updateUI(); 
 });
-socket.on('robot_update', d => { ROBOTS[d.robot] = d.info; updateUI(); });
-socket.on('job_update', d => { JOBS[d.job.id] = d.job; updateUI(); });
+const UPDATE_HANDLERS = {
+    robot_update: d => { ROBOTS[d.robot] = d.info; },
+    job_update: d => { JOBS[d.job.id] = d.job; },
+    job_assigned: d => { ROBOTS[d.robot] = d.info; JOBS[d.job.id] = d.job; },
+};
+socket.on('robot_update', d => { UPDATE_HANDLERS.robot_update(d); updateUI(); });
+socket.on('job_update', d => { UPDATE_HANDLERS.job_update(d); updateUI(); });
+socket.on('batch_update', d => {
+    (d.updates || []).forEach(([ev, payload]) => { if(UPDATE_HANDLERS[ev]) UPDATE_HANDLERS[ev](payload); });
+    updateUI();
+});
 
 function updateUI() {
     // Update Stats
@@ -495,14 +659,15 @@ function drawMap() {
     // 3. Robot Paths (Dynamic & Colored)
     for(let id in ROBOTS) {
         const r = ROBOTS[id];
-        if(r.current_path && r.current_path.length > 1) {
+        const startIdx = r.path_idx || 0;
+        if(r.current_path && r.current_path.length - startIdx > 1) {
             let points = "";
             // Start path from current robot visual position (node)
             const currentPixel = nodeToPixel(r.node);
             points += `${currentPixel.x},${currentPixel.y} `;
             
             // Add rest of the nodes in the path
-            for(let i=1; i<r.current_path.length; i++) {
+            for(let i=startIdx+1; i<r.current_path.length; i++) {
                 const p = nodeToPixel(r.current_path[i]);
                 points += `${p.x},${p.y} `;
             }
@@ -537,7 +702,7 @@ function drawMap() {
         const r = document.createElementNS('http://www.w3.org/2000/svg','circle');
         r.setAttribute('r', 9); 
         r.setAttribute('class', 'robot-circle');
-        r.setAttribute('fill', info.color || '#007bff'); // Use random color
+        r.setAttribute('fill', info.color || '#007bff'); // Use palette color
         
         const t = document.createElementNS('http://www.w3.org/2000/svg','text');
         t.textContent = id.substring(0,2); t.setAttribute('class', 'robot-text');
@@ -578,6 +743,9 @@ setInterval(() => document.getElementById('svtime').innerText = new Date().toLoc
 </html>
 """
 
+# Static page (no template variables): encode once at import time
+HTML_PAGE_BYTES = HTML_PAGE.encode('utf-8')
+
 if __name__ == '__main__':
     print("Server running on port 5000...")
     socketio.run(app, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -1,16 +1,25 @@
 # central_server.py
 # Central planner server for industrial navigation robots
-# Requirements: pip install flask flask-socketio eventlet
+# Requirements: pip install flask flask-socketio eventlet (optional: orjson)
 
+import json
 import time
 import uuid
 import heapq
 import threading
+import itertools
 import random
 from collections import deque
-from flask import Flask, request, jsonify, render_template_string
+from flask import Flask, request, jsonify, Response
 from flask_socketio import SocketIO
 
+try:
+    import orjson
+    def json_dumps(obj): return orjson.dumps(obj).decode('utf-8')
+except ImportError:
+    # Fall back to the stdlib encoder when orjson isn't installed
+    def json_dumps(obj): return json.dumps(obj, separators=(',', ':'))
+
 app = Flask(__name__)
 
 # Use 'threading' for best compatibility on Windows/Python 3.13
@@ -68,107 +77,227 @@ GRAPH = {
 # Time and reservation settings
 TIME_STEP = 1.0
 MAX_SEARCH_DEPTH = 60 # Max steps to look ahead for collision
+# Per search the look-ahead is min(MAX_SEARCH_DEPTH, hops * SEARCH_DEPTH_PER_HOP + SEARCH_DEPTH_SLACK),
+# so short legs give up early instead of exploring the whole window
+SEARCH_DEPTH_PER_HOP = 5
+SEARCH_DEPTH_SLACK = 20
 
 # ----------------------------
 # 2. In-memory State
 # ----------------------------
-robots = {}     # robot_id -> {status, node, color, current_path: []}
+robots = {}     # robot_id -> {status, node, color, current_path: [], path_pos}
 job_queue = []  # Pending jobs
 jobs = {}       # All jobs history
-reservations = {} # (node, time_int) -> robot_id
+reservations = {}       # node idx -> {time_int: robot_id}
+robot_reservations = {} # robot_id -> [(node idx, time_int), ...] in time order
+edge_reservations = {}  # (from idx, to idx, time_int) -> robot_id; leaves from at t, reaches to at t+1
+reservation_heap = []   # (time_int, node idx, robot_id) min-heap, for expiring old slots
+robots_at_node = {}     # node idx -> {robot_id, ...}; inverse of robots[rid]['node']
 state_lock = threading.Lock()
+# The allocator sleeps on alloc_cv until a job is queued or a robot frees up;
+# the timeout still retries jobs that were only blocked by reservations.
+alloc_cv = threading.Condition(state_lock)
+alloc_pending = False
+ALLOC_RETRY_INTERVAL = 2.0
+
+def wake_allocator():
+    """Call with state_lock held after queuing a job or freeing a robot."""
+    global alloc_pending
+    alloc_pending = True
+    alloc_cv.notify()
 
 # ----------------------------
 # 3. Coordinate System
 # ----------------------------
 def build_coords(graph):
     """Parses Node IDs (e.g., '25') into (x=5, y=2) coords"""
-    coords = {}
-    for node in graph:
-        try:
-            r = int(node[0])
-            c = int(node[1])
-            coords[node] = (c, r) # x=c, y=r
-        except:
-            coords[node] = (0, 0)
-    return coords
+    assert all(len(n) == 2 and n.isdigit() and n.isascii() for n in graph), "node ids must be two digits"
+    # Names are two ASCII digits "RC"; ord() avoids int() parsing per char
+    return {node: (ord(node[1]) - 48, ord(node[0]) - 48) for node in graph} # x=c, y=r
 
 NODE_COORDS = build_coords(GRAPH)
 
-def get_manhattan_dist(node_a, node_b):
-    if node_a not in NODE_COORDS or node_b not in NODE_COORDS: return 0
-    ax, ay = NODE_COORDS[node_a]
-    bx, by = NODE_COORDS[node_b]
-    return abs(ax - bx) + abs(ay - by)
+# Planner works on dense integer node ids; names only appear at the API
+# boundary (requests in, robot/job dicts and socket payloads out).
+NODE_LIST = list(GRAPH)                            # idx -> node name
+NODE_ID = {n: i for i, n in enumerate(NODE_LIST)}  # node name -> idx
+ADJ = [tuple(NODE_ID[v] for v in GRAPH[n].values()) for n in NODE_LIST]
+COORDS = [NODE_COORDS[n] for n in NODE_LIST]       # idx -> (x, y)
+
+def to_names(path): return [NODE_LIST[i] for i in path]
+
+# Manhattan distance between every pair of nodes, H[a][b] (symmetric)
+H = [[abs(ax - bx) + abs(ay - by) for bx, by in COORDS] for ax, ay in COORDS]
+
+def bfs_hops(src):
+    """Hop count from src to every node (-1 if unreachable)."""
+    hops = [-1] * len(ADJ)
+    hops[src] = 0
+    q = deque([src])
+    while q:
+        u = q.popleft()
+        for v in ADJ[u]:
+            if hops[v] < 0:
+                hops[v] = hops[u] + 1
+                q.append(v)
+    return hops
+
+# True graph distance, used as the search heuristic. Manhattan overestimates on the
+# 2-cell edges (45-65, 64-84), which lets the search return longer paths. The graph is
+# undirected, so HOPS[end][n] is also n's distance to end.
+HOPS = [bfs_hops(i) for i in range(len(ADJ))]
 
 # ----------------------------
-# 4. Pathfinding: Space-Time A*
+# 4. Pathfinding: Safe Interval Path Planning (SIPP)
 # ----------------------------
-def is_safe(node, t, my_id, prev_node=None):
-    """Checks vertex and edge collisions, plus static obstacles."""
+def idle_blocked(node, my_id, view=None):
+    """True if another robot is parked idle on node. Reads the live tables (state_lock held)
+    or a copy from take_snapshot()."""
+    if view:
+        for rid in view['idle_at'].get(node, ()):
+            if rid != my_id: return True
+        return False
+    for rid in robots_at_node.get(node, ()):
+        if rid != my_id and robots[rid]['status'] == 'idle':
+            # If an idle robot is sitting there, it's blocked unless we nudge it
+            return True
+    return False
+
+def is_safe(node, t, my_id, prev_node=None, view=None):
+    """Checks vertex and edge collisions, plus static obstacles.
+    Reads the live tables (state_lock held) or a copy from take_snapshot()."""
     # 1. Reservation Check (Vertex Conflict)
-    res_id = reservations.get((node, t))
+    slots = (view['reservations'] if view else reservations).get(node)
+    res_id = slots.get(t) if slots else None
     if res_id and res_id != my_id:
         return False
     
     # 2. Edge Conflict (Swap Prevention)
-    # If I am going u->v at time t, ensure no one is going v->u at time t
-    # (This implementation relies on the reservation table effectively blocking the target node)
+    # If I am going prev_node->node, arriving at t, ensure no one is going node->prev_node
+    # in the same step; the vertex table alone lets two robots swap cells
+    if prev_node is not None and prev_node != node:
+        rid = (view['edges'] if view else edge_reservations).get((node, prev_node, t - 1))
+        if rid and rid != my_id:
+            return False
     
     # 3. Static Obstacle Check (Idle robots blocking the way)
-    for rid, info in robots.items():
-        if rid != my_id and info['status'] == 'idle' and info['node'] == node:
-            # If an idle robot is sitting there, it's blocked unless we nudge it
-            return False
-    return True
-
-def space_time_a_star(graph, start, end, start_time, my_id, max_time=MAX_SEARCH_DEPTH):
-    """Returns path [start, n1, n2... end] accounting for time reservations."""
+    return not idle_blocked(node, my_id, view)
+
+def safe_intervals(slots, my_id, lo, hi, skip=None):
+    """Splits [lo, hi] into the maximal windows [(lo, hi), ...] in which no other robot
+    holds the node. slots is the node's {t: robot_id} table; time `skip` is ignored."""
+    blocked = sorted(t for t, rid in slots.items()
+                     if rid != my_id and lo <= t <= hi and t != skip) if slots else ()
+    intervals = []
+    for t in blocked:
+        if t > lo: intervals.append((lo, t - 1))
+        lo = t + 1
+    if lo <= hi: intervals.append((lo, hi))
+    return intervals
+
+def sipp(start, end, start_time, my_id, max_time=MAX_SEARCH_DEPTH, view=None):
+    """Returns node-id path [start, n1, n2... end] accounting for time reservations.
+    The path has one entry per timestep from start_time; repeated nodes are waits."""
+    # A search state is (node, safe interval index) instead of (node, time): arriving
+    # earlier in the same interval dominates, since the robot can wait out the rest of
+    # it in place. Each move pushes only its earliest feasible arrival.
+    # States are packed into one int, interval_idx * N + node, as small-int dict keys.
+    n_nodes = len(NODE_LIST)
+    heappush, heappop = heapq.heappush, heapq.heappop
+    adj, h_end = ADJ, HOPS[end] # heuristic to the goal is one list index per neighbour
+    if h_end[start] < 0: return None
+    
+    res = view['reservations'] if view else reservations
+    edges = view['edges'] if view else edge_reservations
+    horizon = start_time + min(max_time, h_end[start] * SEARCH_DEPTH_PER_HOP + SEARCH_DEPTH_SLACK)
+    # Safe intervals per node, built the first time the search touches it. Nodes with
+    # an idle robot parked on them have none. The robot already stands on start, so
+    # start_time is never blocked there and interval 0 begins at start_time; if it
+    # shares start with an idle robot it must leave on the first step.
+    if idle_blocked(start, my_id, view):
+        start_ivs = [(start_time, start_time)]
+    else:
+        start_ivs = safe_intervals(res.get(start), my_id, start_time, horizon, skip=start_time)
+    intervals = [None] * n_nodes
+    intervals[start] = start_ivs
+    
     open_set = []
-    # Priority Queue: (f_score, g_score, current_node, path_history)
-    heapq.heappush(open_set, (0, 0, start, [start])) 
-    visited = set() # (node, time)
+    # Priority Queue: (f_score, h, -seq, arrival_time, node, interval_idx); paths are
+    # rebuilt from came_from. On equal f, prefer the state closer to the goal, then the
+    # most recently pushed one, so plateaus of equal-f states are not expanded breadth-first.
+    seq = itertools.count()
+    heappush(open_set, (h_end[start], h_end[start], 0, start_time, start, 0))
+    came_from = {} # state -> previous state
+    # Earliest arrival seen per state; stale heap entries are skipped when popped.
+    best = {start: start_time}
+    inf = float('inf')
     
     while open_set:
-        f, g, current, path = heapq.heappop(open_set)
-        current_time = start_time + g
+        f, h, _, t, current, k = heappop(open_set)
+        state = k * n_nodes + current
+        if t > best[state]: continue
         
         if current == end:
-            return path
+            return reconstruct_path(came_from, best, state, n_nodes)
         
-        if g >= max_time: continue
-            
-        # Neighbors + Wait (stay current)
-        neighbors = list(graph.get(current, {}).values())
-        neighbors.append(current) 
-        
-        for neighbor in neighbors:
-            next_time = current_time + 1
-            if (neighbor, next_time) in visited: continue
-            
-            if is_safe(neighbor, next_time, my_id, current):
-                visited.add((neighbor, next_time))
-                new_g = g + 1
-                h = get_manhattan_dist(neighbor, end)
-                if neighbor == current: new_g += 1.1 # Penalty for waiting
+        # Latest departure: we can wait here until our interval closes
+        leave_by = intervals[current][k][1] + 1
+        for neighbor in adj[current]:
+            ivs = intervals[neighbor]
+            if ivs is None:
+                ivs = intervals[neighbor] = [] if idle_blocked(neighbor, my_id, view) else \
+                    safe_intervals(res.get(neighbor), my_id, start_time, horizon)
+            for k2, (lo, hi) in enumerate(ivs):
+                arrival = t + 1 if t + 1 > lo else lo
+                if arrival > leave_by: break # later intervals open even later
+                if hi > leave_by: hi = leave_by
+                # A robot crossing the edge the other way in the same step would swap
+                # with us; leave a step later, as long as both intervals still allow it
+                while arrival <= hi and edges.get((neighbor, current, arrival - 1), my_id) != my_id:
+                    arrival += 1
+                if arrival > hi: continue
+                next_state = k2 * n_nodes + neighbor
+                if arrival >= best.get(next_state, inf): continue
                 
-                new_f = new_g + h
-                heapq.heappush(open_set, (new_f, new_g, neighbor, path + [neighbor]))
+                h = h_end[neighbor]
+                best[next_state] = arrival
+                came_from[next_state] = state
+                heappush(open_set, (arrival + h, h, -next(seq), arrival, neighbor, k2))
     return None
 
-def simple_dijkstra(graph, start, end):
+def reconstruct_path(came_from, best, state, n_nodes):
+    """Walks parent pointers back from a packed state and expands the hops into one
+    node per timestep, padding each hop's source with the waits spent there."""
+    hops = [(state % n_nodes, best[state])]
+    while state in came_from:
+        state = came_from[state]
+        hops.append((state % n_nodes, best[state]))
+    hops.reverse()
+    path = []
+    for (node, t), (_, next_t) in zip(hops, hops[1:]):
+        path.extend([node] * (next_t - t))
+    path.append(hops[-1][0])
+    return path
+
+def simple_dijkstra(start, end):
     """Fallback for nudge logic calculation"""
     if start == end: return [start]
-    q = [(0, start, [])]
-    visited = set()
+    q = [(0, start)]
+    # Unit edge costs: the first time a node is reached is via a shortest path
+    came_from = {start: None}
     while q:
-        c, n, p = heapq.heappop(q)
-        if n in visited: continue
-        visited.add(n)
-        path = p + [n]
-        if n == end: return path
-        for _, neigh in graph.get(n, {}).items():
-            if neigh not in visited: heapq.heappush(q, (c+1, neigh, path))
+        c, n = heapq.heappop(q)
+        if n == end:
+            path = []
+            while n is not None:
+                path.append(n)
+                n = came_from[n]
+            path.reverse()
+            return path
+        for neigh in ADJ[n]:
+            if neigh not in came_from:
+                came_from[neigh] = n
+                heapq.heappush(q, (c+1, neigh))
     return None
 
 # ----------------------------
@@ -176,100 +305,241 @@ def simple_dijkstra(graph, start, end):
 # ----------------------------
 def reserve_path_trajectory(path, start_time, robot_id):
     # Clear old reservations
-    keys = [k for k, v in reservations.items() if v == robot_id]
-    for k in keys: del reservations[k]
+    release_reservations(robot_id)
     # Reserve new
+    held = robot_reservations[robot_id] = []
     for i, node in enumerate(path):
-        reservations[(node, start_time + i)] = robot_id
-
-def find_free_neighbor(graph, node, excluded_nodes):
-    neighbors = list(graph.get(node, {}).values())
-    random.shuffle(neighbors)
+        t = start_time + i
+        reservations.setdefault(node, {})[t] = robot_id
+        held.append((node, t))
+        heapq.heappush(reservation_heap, (t, node, robot_id))
+        if i and path[i - 1] != node:
+            edge_reservations[(path[i - 1], node, t - 1)] = robot_id
+
+def release_reservations(robot_id):
+    # O(robot's own path) instead of scanning every reservation in the system
+    prev = None
+    for node, t in robot_reservations.pop(robot_id, []):
+        slots = reservations.get(node)
+        if slots and slots.get(t) == robot_id:
+            del slots[t]
+        # Consecutive held slots are the edges this robot reserved
+        if prev is not None and prev != node:
+            key = (prev, node, t - 1)
+            if edge_reservations.get(key) == robot_id:
+                del edge_reservations[key]
+        prev = node
+
+def prune_reservations(cutoff):
+    # Pop expired slots off the expiry heap: O(expired) per tick no matter how many
+    # robots or reservations exist. Entries already released are skipped by the
+    # owner check. Expired (node, t) pairs left in robot_reservations are harmless
+    # and go away with the robot's next release.
+    heap = reservation_heap
+    while heap and heap[0][0] < cutoff:
+        t, node, rid = heapq.heappop(heap)
+        slots = reservations.get(node)
+        if slots and slots.get(t) == rid:
+            del slots[t]
+        # The edge leaving node at t expires with it
+        for nb in ADJ[node]:
+            key = (node, nb, t)
+            if edge_reservations.get(key) == rid:
+                del edge_reservations[key]
+
+def find_free_neighbor(node, excluded_nodes, goal=None, view=None):
+    """Free neighbour of node off excluded_nodes, or None. With a goal, prefers the
+    neighbour farthest from it, so a nudged robot moves out of the way of traffic."""
+    occupied = view['occupied'] if view else robots_at_node
+    neighbors = ADJ[node]
+    if goal is not None:
+        neighbors = sorted(neighbors, key=H[goal].__getitem__, reverse=True)
     for n in neighbors:
         if n in excluded_nodes: continue
-        occupied = False
-        for r in robots.values():
-            if r['node'] == n: occupied = True
-        if not occupied: return n
+        if n not in occupied: return n
     return None
 
+def index_robot_node(rid, old_node, new_node):
+    """Keeps robots_at_node in step when a robot's node name changes."""
+    old, new = NODE_ID.get(old_node), NODE_ID.get(new_node)
+    if old == new: return
+    if old is not None:
+        here = robots_at_node.get(old)
+        if here:
+            here.discard(rid)
+            if not here: del robots_at_node[old]
+    if new is not None:
+        robots_at_node.setdefault(new, set()).add(rid)
+
 def generate_random_color():
     return "#{:06x}".format(random.randint(0x444444, 0xFFFFFF))
 
 # ----------------------------
 # 6. Allocator Thread
 # ----------------------------
+def take_snapshot():
+    """Copies what planning reads so SIPP can run without state_lock. Call with the lock held."""
+    idle_at = {} # node idx -> idle robot ids
+    for rid, info in robots.items():
+        if info['status'] == 'idle':
+            n = NODE_ID.get(info['node'])
+            if n is not None: idle_at.setdefault(n, set()).add(rid)
+    return {
+        'reservations': {n: dict(slots) for n, slots in reservations.items() if slots},
+        'edges': dict(edge_reservations),
+        'idle_at': idle_at,
+        'occupied': set(robots_at_node),
+    }
+
+def plan_pass(pending, idle, view, current_t):
+    """Plans queued jobs against a snapshot, without state_lock.
+    Returns ('assign', job, robot_id, robot_node, path), ('nudge', robot_id, robot_node, path)
+    and ('fail', job) entries for commit_plans(); paths are node ids."""
+    plans = []
+    for job in pending:
+        if not idle: break
+        
+        robot_id, robot_node = idle[0]
+        start = NODE_ID[robot_node]  # allocator_loop only passes robots on known nodes
+        pickup = NODE_ID.get(job['pickup'])
+        drop = NODE_ID.get(job['drop'])
+        if pickup is None or drop is None:
+            # A job naming an unknown node can never be planned; don't retry it every tick
+            plans.append(('fail', job))
+            continue
+        
+        # Try SIPP
+        path = sipp(start, pickup, current_t, robot_id, view=view)
+        
+        if path:
+            # Plan leg 2 (Pickup -> Drop)
+            arrival_t = current_t + len(path) - 1
+            path2 = sipp(pickup, drop, arrival_t, robot_id, view=view)
+            
+            if path2:
+                full_path = path + path2[1:]
+                # Later jobs in this pass must see the slots taken and the robot busy
+                for i, n in enumerate(full_path):
+                    view['reservations'].setdefault(n, {})[current_t + i] = robot_id
+                    if i and full_path[i - 1] != n:
+                        view['edges'][(full_path[i - 1], n, current_t + i - 1)] = robot_id
+                view['idle_at'][start].discard(robot_id)
+                idle.pop(0)
+                plans.append(('assign', job, robot_id, robot_node, full_path))
+                continue # Job assigned, move to next job
+
+        # NUDGE LOGIC: If pathfinding failed, check if an idle robot is blocking
+        naive_path = simple_dijkstra(start, pickup)
+        if naive_path:
+            blocker_id = None
+            idle_at = view['idle_at']
+            for n in naive_path:
+                blocker_id = next((rid for rid in idle_at.get(n, ()) if rid != robot_id), None)
+                if blocker_id: break
+            
+            if blocker_id:
+                # Found a blocker, move them
+                blocker_node = n
+                safe = find_free_neighbor(blocker_node, naive_path, naive_path[-1], view)
+                if safe is not None:
+                    esc_path = sipp(blocker_node, safe, current_t, blocker_id, view=view)
+                    if esc_path:
+                        plans.append(('nudge', blocker_id, NODE_LIST[blocker_node], esc_path))
+                        break # Break to let things settle
+    return plans
+
+def robot_unchanged(robot_id, robot_node):
+    info = robots.get(robot_id)
+    return info is not None and info['status'] == 'idle' and info['node'] == robot_node
+
+def path_still_free(path, start_time, robot_id):
+    return all(is_safe(n, start_time + i, robot_id, path[i - 1]) for i, n in enumerate(path) if i)
+
+def commit_plans(plans, current_t, pending_emits):
+    """Applies plan_pass() results with state_lock held. Anything the live state
+    has invalidated since the snapshot is dropped and the allocator retries.
+    Dashboard events are appended to pending_emits for flush_emits()."""
+    for plan in plans:
+        if plan[0] == 'fail':
+            job = plan[1]
+            if job['status'] != 'queued' or job not in job_queue: continue
+            job['status'] = 'failed'
+            job_queue.remove(job)
+            pending_emits.append(('job_update', {'job': dict(job)}))
+        
+        elif plan[0] == 'assign':
+            _, job, robot_id, robot_node, full_path = plan
+            if job['status'] != 'queued' or job not in job_queue: continue
+            if not robot_unchanged(robot_id, robot_node) or not path_still_free(full_path, current_t, robot_id):
+                wake_allocator()
+                continue
+            reserve_path_trajectory(full_path, current_t, robot_id)
+            full_names = to_names(full_path)
+            
+            job['assigned_robot'] = robot_id
+            job['status'] = 'assigned'
+            job['path'] = full_names
+            job_queue.remove(job)
+            
+            robots[robot_id]['status'] = 'busy'
+            robots[robot_id]['current_job'] = job['id']
+            robots[robot_id]['current_path'] = full_names
+            robots[robot_id]['path_pos'] = 0 # Index of the robot's node in current_path
+            
+            pending_emits.append(('job_update', {'job': dict(job)}))
+            pending_emits.append(('robot_update', {'robot': robot_id, 'info': dict(robots[robot_id])}))
+        
+        else:
+            _, blocker_id, blocker_node, esc_path = plan
+            if not robot_unchanged(blocker_id, blocker_node) or not path_still_free(esc_path, current_t, blocker_id):
+                wake_allocator()
+                continue
+            safe = NODE_LIST[esc_path[-1]]
+            nudge_id = str(uuid.uuid4())[:8]
+            nudge_job = {'id': nudge_id, 'pickup': safe, 'drop': safe, 'status': 'assigned', 'assigned_robot': blocker_id}
+            reserve_path_trajectory(esc_path, current_t, blocker_id)
+            robots[blocker_id]['status'] = 'busy'
+            robots[blocker_id]['current_job'] = nudge_id
+            robots[blocker_id]['current_path'] = to_names(esc_path)
+            robots[blocker_id]['path_pos'] = 0
+            jobs[nudge_id] = nudge_job
+            pending_emits.append(('job_update', {'job': dict(nudge_job)}))
+            pending_emits.append(('robot_update', {'robot': blocker_id, 'info': dict(robots[blocker_id])}))
+
+def flush_emits(pending_emits):
+    """Sends events collected under state_lock once the lock has been released.
+    Payloads are copies, so encoding them can't race with later state changes.
+    Each payload is serialized once up front and goes out as a JSON string, so
+    broadcasting to many dashboards doesn't re-encode the dict per client."""
+    for event, payload in pending_emits:
+        socketio.emit(event, json_dumps(payload))
+
 def allocator_loop():
+    global alloc_pending
     while True:
-        with state_lock:
+        with alloc_cv:
+            alloc_cv.wait_for(lambda: alloc_pending, timeout=ALLOC_RETRY_INTERVAL)
+            alloc_pending = False
             current_t = int(time.time())
             # Cleanup old reservations
-            old = [k for k in reservations if k[1] < current_t]
-            for k in old: del reservations[k]
+            prune_reservations(current_t)
             
             # Process Queued Jobs
             pending = [j for j in job_queue if j['status'] == 'queued']
-            
-            for job in pending:
-                idle = [r for r, info in robots.items() if info['status'] == 'idle']
-                if not idle: break
-                
-                robot_id = idle[0]
-                start_node = robots[robot_id]['node']
-                
-                # Try Space-Time A*
-                path = space_time_a_star(GRAPH, start_node, job['pickup'], current_t, robot_id)
-                
-                if path:
-                    # Plan leg 2 (Pickup -> Drop)
-                    arrival_t = current_t + len(path) - 1
-                    path2 = space_time_a_star(GRAPH, job['pickup'], job['drop'], arrival_t, robot_id)
-                    
-                    if path2:
-                        full_path = path + path2[1:]
-                        reserve_path_trajectory(full_path, current_t, robot_id)
-                        
-                        job['assigned_robot'] = robot_id
-                        job['status'] = 'assigned'
-                        job['path'] = full_path
-                        job_queue.remove(job)
-                        
-                        robots[robot_id]['status'] = 'busy'
-                        robots[robot_id]['current_job'] = job['id']
-                        robots[robot_id]['current_path'] = full_path
-                        
-                        socketio.emit('job_update', {'job': job})
-                        socketio.emit('robot_update', {'robot': robot_id, 'info': robots[robot_id]})
-                        continue # Job assigned, move to next job
-
-                # NUDGE LOGIC: If pathfinding failed, check if an idle robot is blocking
-                naive_path = simple_dijkstra(GRAPH, start_node, job['pickup'])
-                if naive_path:
-                    blocker_id = None
-                    for n in naive_path:
-                        for rid, r in robots.items():
-                            if r['node'] == n and r['status'] == 'idle' and rid != robot_id:
-                                blocker_id = rid
-                                break
-                        if blocker_id: break
-                    
-                    if blocker_id:
-                        # Found a blocker, move them
-                        safe = find_free_neighbor(GRAPH, robots[blocker_id]['node'], naive_path)
-                        if safe:
-                            nudge_id = str(uuid.uuid4())[:8]
-                            nudge_job = {'id': nudge_id, 'pickup': safe, 'drop': safe, 'status': 'assigned', 'assigned_robot': blocker_id}
-                            esc_path = space_time_a_star(GRAPH, robots[blocker_id]['node'], safe, current_t, blocker_id)
-                            if esc_path:
-                                reserve_path_trajectory(esc_path, current_t, blocker_id)
-                                robots[blocker_id]['status'] = 'busy'
-                                robots[blocker_id]['current_job'] = nudge_id
-                                robots[blocker_id]['current_path'] = esc_path
-                                jobs[nudge_id] = nudge_job
-                                socketio.emit('job_update', {'job': nudge_job})
-                                socketio.emit('robot_update', {'robot': blocker_id, 'info': robots[blocker_id]})
-                                break # Break to let things settle
-        time.sleep(0.5)
+            # A robot that reported a node outside GRAPH can't be planned from; leaving
+            # it out keeps jobs queued for the others instead of failing them
+            idle = [(rid, info['node']) for rid, info in robots.items()
+                    if info['status'] == 'idle' and info['node'] in NODE_ID]
+            if not pending or not idle: continue
+            view = take_snapshot()
+        
+        # SIPP runs on the snapshot without state_lock; only the commit takes it
+        plans = plan_pass(pending, idle, view, current_t)
+        if plans:
+            pending_emits = []
+            with state_lock:
+                commit_plans(plans, current_t, pending_emits)
+            flush_emits(pending_emits)
 
 threading.Thread(target=allocator_loop, daemon=True).start()
 
@@ -277,7 +547,8 @@ threading.Thread(target=allocator_loop, daemon=True).start()
 # 7. HTTP API
 # ----------------------------
 @app.route('/')
-def index(): return render_template_string(HTML_PAGE)
+def index():
+    return Response(HTML_PAGE_BYTES, mimetype='text/html', headers={'Cache-Control': 'max-age=300'})
 
 @app.route('/submit_job', methods=['POST'])
 def submit_job():
@@ -288,7 +559,9 @@ def submit_job():
     with state_lock:
         job_queue.append(job)
         jobs[job_id] = job
-    socketio.emit('job_update', {'job': job})
+        payload = {'job': dict(job)}
+        wake_allocator()
+    socketio.emit('job_update', json_dumps(payload))
     return jsonify({'job_id': job_id}), 200
 
 @app.route('/register_robot', methods=['POST'])
@@ -299,8 +572,11 @@ def register_robot():
     color = generate_random_color()
     with state_lock:
         if rid in robots: color = robots[rid].get('color', color)
-        robots[rid] = {'status': 'idle', 'node': node, 'last_seen': time.time(), 'color': color, 'current_path': []}
-    socketio.emit('robot_update', {'robot': rid, 'info': robots[rid]})
+        index_robot_node(rid, robots[rid]['node'] if rid in robots else None, node)
+        robots[rid] = {'status': 'idle', 'node': node, 'last_seen': time.time(), 'color': color, 'current_path': [], 'path_pos': 0}
+        payload = {'robot': rid, 'info': dict(robots[rid])}
+        wake_allocator()
+    socketio.emit('robot_update', json_dumps(payload))
     return jsonify({'robot_id': rid, 'color': color}), 200
 
 @app.route('/poll_task', methods=['GET'])
@@ -317,28 +593,35 @@ def poll_task():
 def update_location():
     data = request.json or {}
     rid, node, status = data.get('robot_id'), data.get('node'), data.get('status')
+    pending_emits = []
     with state_lock:
         if rid not in robots: return jsonify({'error': 'unknown'}), 400
+        index_robot_node(rid, robots[rid]['node'], node)
         robots[rid]['node'] = node
         robots[rid]['last_seen'] = time.time()
         
-        # Path Consumption (Visual)
-        path = robots[rid].get('current_path', [])
-        if node in path:
-            robots[rid]['current_path'] = path[path.index(node):] # Slice path
+        # Path Consumption (Visual): advance path_pos to the reached node instead of
+        # re-slicing the path; robots move forward, so this is usually one step.
+        path = robots[rid].get('current_path')
+        if path:
+            pos = robots[rid].get('path_pos', 0)
+            while pos < len(path) and path[pos] != node: pos += 1
+            if pos < len(path): robots[rid]['path_pos'] = pos
             
         if status == 'job_done':
             jid = robots[rid].get('current_job')
             if jid and jid in jobs:
                 jobs[jid]['status'] = 'done'
-                socketio.emit('job_update', {'job': jobs[jid]})
+                pending_emits.append(('job_update', {'job': dict(jobs[jid])}))
             robots[rid]['status'] = 'idle'
             robots[rid]['current_path'] = []
+            robots[rid]['path_pos'] = 0
             robots[rid].pop('current_job', None)
-            keys = [k for k,v in reservations.items() if v==rid]
-            for k in keys: del reservations[k]
+            release_reservations(rid)
+            wake_allocator()
             
-        socketio.emit('robot_update', {'robot': rid, 'info': robots[rid]})
+        pending_emits.append(('robot_update', {'robot': rid, 'info': dict(robots[rid])}))
+    flush_emits(pending_emits)
     return jsonify({'ok': True}), 200
 
 @app.route('/reset_sim', methods=['POST'])
@@ -346,21 +629,27 @@ def reset_sim():
     with state_lock:
         job_queue.clear()
         reservations.clear()
+        robot_reservations.clear()
+        edge_reservations.clear()
+        reservation_heap.clear()
         for j in jobs.values():
             if j['status'] == 'assigned': j['status'] = 'failed'
-            socketio.emit('job_update', {'job': j})
         for r in robots.values():
             r['status'] = 'idle'
             r['current_path'] = []
+            r['path_pos'] = 0
             r.pop('current_job', None)
-            socketio.emit('robot_update', {'robot': r['id'] if 'id' in r else 'unknown', 'info': r}) # Fix for dict access
+        # One snapshot instead of an event per robot and job
+        snapshot = {'robots': {rid: dict(r) for rid, r in robots.items()}, 'jobs': [dict(j) for j in jobs.values()]}
+    socketio.emit('state_snapshot', snapshot)
     return jsonify({'ok':True}), 200
 
 @socketio.on('connect')
 def on_connect():
     with state_lock:
-        socketio.emit('layout', {'nodes': NODE_COORDS, 'graph': GRAPH})
-        socketio.emit('state_snapshot', {'robots': robots, 'jobs': list(jobs.values())})
+        snapshot = {'robots': {rid: dict(r) for rid, r in robots.items()}, 'jobs': [dict(j) for j in jobs.values()]}
+    socketio.emit('layout', {'nodes': NODE_COORDS, 'graph': GRAPH})
+    socketio.emit('state_snapshot', snapshot)
 
 # ----------------------------
 # 8. Dashboard HTML
@@ -461,8 +750,10 @@ let isDragging = false, startDrag = { x: 0, y: 0 };
 socket.on('connect', () => console.log('Connected'));
 socket.on('layout', d => { NODE_COORDS = d.nodes; GRAPH_DATA = d.graph; drawMap(); });
 socket.on('state_snapshot', d => { ROBOTS = d.robots||{}; JOBS={}; (d.jobs||[]).forEach(j=>JOBS[j.id]=j); updateUI(); });
-socket.on('robot_update', d => { ROBOTS[d.robot] = d.info; updateUI(); });
-socket.on('job_update', d => { JOBS[d.job.id] = d.job; updateUI(); });
+// robot_update / job_update arrive pre-serialized as JSON strings
+const parse = raw => typeof raw === 'string' ? JSON.parse(raw) : raw;
+socket.on('robot_update', raw => { const d = parse(raw); ROBOTS[d.robot] = d.info; updateUI(); });
+socket.on('job_update', raw => { const d = parse(raw); JOBS[d.job.id] = d.job; updateUI(); });
 
 function updateUI() {
     document.getElementById('stat-robots').innerText = Object.keys(ROBOTS).length;
@@ -518,7 +809,7 @@ function drawMap() {
         const r = ROBOTS[id];
         if(r.current_path && r.current_path.length > 0) {
             let pts = `${nodeToPixel(r.node).x},${nodeToPixel(r.node).y} `;
-            r.current_path.forEach(n => { const p = nodeToPixel(n); pts += `${p.x},${p.y} `; });
+            r.current_path.slice(r.path_pos || 0).forEach(n => { const p = nodeToPixel(n); pts += `${p.x},${p.y} `; });
             const line = document.createElementNS('http://www.w3.org/2000/svg','polyline');
             line.setAttribute('points', pts);
             line.setAttribute('class', 'robot-path');
@@ -585,6 +876,9 @@ svg.addEventListener('wheel', e => { e.preventDefault(); transform.k *= (1 + (e.
 </html>
 """
 
+# Static page (no template variables): encode once at import time
+HTML_PAGE_BYTES = HTML_PAGE.encode('utf-8')
+
 if __name__ == '__main__':
     print("Server running on port 5000...")
     socketio.run(app, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -1,14 +1,44 @@
 # server.py
+# Serving mode: plain threads by default. LFR_ASYNC_MODE=eventlet or gevent runs
+# requests and the background loops as green threads, which scales to many more
+# polling robots per process; that library has to be installed and must patch
+# the stdlib before anything else is imported.
+import os
+ASYNC_MODE = os.environ.get('LFR_ASYNC_MODE', 'threading')
+if ASYNC_MODE == 'eventlet':
+    import eventlet
+    eventlet.monkey_patch()
+elif ASYNC_MODE == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+
 import time
 import uuid
 import heapq
 import threading
 import random
-from flask import Flask, request, jsonify, render_template_string
+from contextlib import contextmanager
+from flask import Flask, Response, request, jsonify, render_template_string
 from flask_socketio import SocketIO
 
+try:
+    import orjson
+    json_dumps = orjson.dumps
+except ImportError:
+    import json
+    # Fall back to the stdlib encoder when orjson isn't installed
+    def json_dumps(obj): return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+OK_BODY = json_dumps({'ok': True})
+
+def json_response(body, status=200):
+    # body is a dict, or bytes already produced by json_dumps
+    if not isinstance(body, bytes):
+        body = json_dumps(body)
+    return Response(body, status=status, mimetype='application/json')
+
 app = Flask(__name__)
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode=ASYNC_MODE)
 
 # ---------------------------------------------------------
 # 1. Map Graph
@@ -61,15 +91,138 @@ GRAPH ={
 PARKING_NODES = ['81','82','83','84','85','86','11','12','13','15','26','31','46','51','56']
 
 MAX_SEARCH_DEPTH = 60
+PATH_SEEK_WINDOW = 3  # how far ahead update_location looks for the reported node
+# A* costs are ints in tenths of a step, so the open list can be a bucket queue
+MOVE_COST = 10
+WAIT_COST = 21  # waiting costs 2.1 steps, so the search prefers moving
 
 # ---------------------------------------------------------
 # 2. State
 # ---------------------------------------------------------
-robots = {}       # robot_id -> dict
+# Robots are stored column-wise, one dict per field keyed by robot_id, so scans
+# like "which robots are idle" walk a single small dict. robot_view() puts the
+# per-robot dict back together for the dashboard.
+robot_status = {} # robot_id -> 'idle' | 'busy'; a robot is registered iff it is here
+robot_node = {}   # robot_id -> node name
+robot_dir = {}    # robot_id -> heading 0..3, an index into DIR_CH
+robot_color = {}  # robot_id -> '#rrggbb'
+robot_path = {}   # robot_id -> its assigned path, never sliced as it moves
+robot_pos = {}    # robot_id -> index in robot_path of the node it last reported
+robot_job = {}    # robot_id -> current_job id, only while it has one
+robot_seen = {}   # robot_id -> last_seen timestamp
+poll_cache = {}   # robot_id -> poll_task body; dropped by mark_robot/mark_job
 jobs = {}         # job_id -> dict
 job_queue = []    # queued user jobs
-reservations = {} # (node, time) -> robot_id
-state_lock = threading.Lock()
+reservations = {} # time -> {node: robot_id}, one small table per time step
+robot_reservations = {} # robot_id -> [(node, time), ...] it reserved, so they can be freed directly
+reservation_heap = []   # min-heap of the times in reservations, for expiring whole steps
+idle_at = {}      # node -> {robot_id, ...} of idle robots parked there
+idle_node = {}    # robot_id -> node, for robots currently in idle_at
+# Bumped whenever reservations or idle robot positions change; A* results are
+# cached per version, so a bump is what invalidates them
+reservations_version = 0
+path_cache = {}   # (start, end, via, t0, rid, max_time, version) -> path tuple or None
+PATH_CACHE_MAX = 1024
+path_cache_lock = threading.Lock()  # planning runs without state_lock, so the cache has its own
+
+class RWLock:
+    # many readers or one writer; waiting writers go first so a stream of polls
+    # can't starve the allocator. Not reentrant.
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+# Locking. state_lock guards the shared tables: jobs/job_queue/reservations/
+# idle_at. path_cache is read and filled by planning that runs without
+# state_lock, so it has its own path_cache_lock, held only around the dict
+# operations and never across a search. Each robot also has its own lock in robot_locks, held by
+# anything that writes that robot's robot_* columns or its poll_cache entry.
+# A robot's status, and the node of an idle robot, only change with both held
+# (state_lock first, then the robot's), so the allocator can read them under
+# state_lock alone; a busy robot's position heartbeat takes just its own lock.
+# GRAPH and NODE_COORDS never change after import and are read without locks;
+# A* runs on take_snapshot() copies.
+state_lock = RWLock()
+robot_locks = {}  # robot_id -> Lock; added by register_robot, never removed
+
+@contextmanager
+def robot_write(rid):
+    # state_lock for writing, then rid's own lock: the order everyone uses
+    with state_lock.write(), robot_locks[rid]:
+        yield
+
+# Wakes the allocator when a job is queued or a robot goes idle. It has its own
+# lock (state_lock is an RWLock, not a plain Lock) and is never held while
+# taking state_lock, so notifying from inside state_lock is safe.
+alloc_cv = threading.Condition()
+alloc_wanted = False
+ALLOC_IDLE_WAIT = 2.0   # nothing to do: wake anyway this often to expire reservations
+ALLOC_RETRY_WAIT = 0.5  # jobs left that couldn't be planned yet: retry at the old tick
+
+# Dashboard updates are coalesced: mutations mark robots/jobs dirty and
+# emitter_loop sends one 'batch' event per EMIT_INTERVAL with the latest state
+# of everything marked since the last one. dirty_lock is a leaf: nothing else
+# is taken while holding it.
+dirty_robots = set()
+dirty_jobs = set()
+dirty_lock = threading.Lock()
+emit_wanted = threading.Event()
+EMIT_INTERVAL = 0.05
+
+def mark_robot(rid):
+    # call with rid's lock held, after the change: dropping poll_cache under it
+    # means a poll can't put back a body built from the old state
+    poll_cache.pop(rid, None)
+    with dirty_lock:
+        dirty_robots.add(rid)
+    emit_wanted.set()
+
+def mark_job(jid):
+    # call with state_lock held for writing, and the assigned robot's lock if
+    # the poll_cache drop is to be race-free (or mark_robot it afterwards)
+    job = jobs.get(jid)
+    if job and job.get('assigned_robot'):
+        poll_cache.pop(job['assigned_robot'], None)
+    with dirty_lock:
+        dirty_jobs.add(jid)
+    emit_wanted.set()
+
+def wake_allocator():
+    global alloc_wanted
+    with alloc_cv:
+        alloc_wanted = True
+        alloc_cv.notify()
 
 # ---------------------------------------------------------
 # 3. Helpers / Pathfinding / Reservations
@@ -85,119 +238,288 @@ def build_coords(graph):
 
 NODE_COORDS = build_coords(GRAPH)
 
-def get_manhattan_dist(a,b):
-    ax,ay = NODE_COORDS.get(a,(0,0))
-    bx,by = NODE_COORDS.get(b,(0,0))
-    return abs(ax-bx) + abs(ay-by)
-
-def is_safe(node, t, rid):
-    owner = reservations.get((node,t))
+def build_tables(graph):
+    # dense int ids for the planner: idx -> name, name -> idx, and each node's
+    # successors as ids (every exit plus staying put, i.e. wait)
+    names = list(graph)
+    ids = {n: i for i, n in enumerate(names)}
+    succ = [tuple(ids[v] for v in graph[n].values()) + (i,) for i, n in enumerate(names)]
+    return names, ids, succ
+
+def build_dist(succ):
+    # all-pairs step counts by BFS from every node over the directed edges:
+    # dist[u][v], None where v can't be reached from u
+    n = len(succ)
+    dist = []
+    for u in range(n):
+        row = [None] * n
+        row[u] = 0
+        frontier = [u]
+        while frontier:
+            nxt = []
+            for a in frontier:
+                for b in succ[a]:
+                    if row[b] is None:
+                        row[b] = row[a] + 1
+                        nxt.append(b)
+            frontier = nxt
+        dist.append(row)
+    return dist
+
+NODE_LIST, NODE_ID, NEIGHBORS_WITH_WAIT = build_tables(GRAPH)
+DIST = build_dist(NEIGHBORS_WITH_WAIT)
+PARKING_XY = [(p,) + NODE_COORDS.get(p, (0,0)) for p in PARKING_NODES]
+
+def bump_reservations_version():
+    global reservations_version
+    reservations_version += 1
+
+def robot_view(rid):
+    # the per-robot dict the dashboard expects; built only for emits
+    info = {'status': robot_status[rid], 'node': robot_node[rid], 'last_seen': robot_seen[rid],
+            'color': robot_color[rid], 'current_path': robot_path[rid][robot_pos[rid]:], 'dir': DIR_CH[robot_dir[rid]]}
+    if rid in robot_job:
+        info['current_job'] = robot_job[rid]
+    return info
+
+def set_robot_path(rid, path):
+    robot_path[rid] = path
+    robot_pos[rid] = 0
+
+def index_robot(rid):
+    # keep idle_at in step with robot_status/robot_node; call after changing either
+    old = idle_node.pop(rid, None)
+    if old is not None:
+        occupants = idle_at[old]
+        occupants.discard(rid)
+        if not occupants:
+            del idle_at[old]
+    new = robot_node[rid] if robot_status.get(rid) == 'idle' else None
+    if new is not None:
+        idle_node[rid] = new
+        idle_at.setdefault(new, set()).add(rid)
+    if new != old:
+        bump_reservations_version()
+
+def take_snapshot():
+    # copies what A* reads so it can run without state_lock; call with the lock held
+    return {'reservations': {t: dict(slot) for t, slot in reservations.items()},
+            'idle_at': {n: set(occ) for n, occ in idle_at.items()},
+            'version': reservations_version}
+
+def is_safe(node, t, rid, view=None):
+    # reads the live tables (state_lock held) or a copy from take_snapshot()
+    res, idle = (view['reservations'], view['idle_at']) if view else (reservations, idle_at)
+    slot = res.get(t)
+    owner = slot.get(node) if slot else None
     if owner and owner != rid:
         return False
-    for orid, info in robots.items():
-        if orid != rid and info.get('status') == 'idle' and info.get('node') == node:
+    # idle robots block their node; one dict lookup instead of a scan over robots
+    for orid in idle.get(node, ()):
+        if orid != rid:
             return False
     return True
 
-def space_time_a_star(graph, start, end, t0, rid, max_time=MAX_SEARCH_DEPTH):
-    open_set = []
-    heapq.heappush(open_set, (0, 0, start, [start]))
-    visited = set()
-    while open_set:
-        f, g, curr, path = heapq.heappop(open_set)
-        current_time = t0 + g
-        if curr == end:
-            return path
-        if g >= max_time:
+def space_time_a_star(graph, start, end, t0, rid, max_time=MAX_SEARCH_DEPTH, view=None, via=None):
+    # Cached by reservations version: the allocator retries queued jobs every tick
+    # and robots re-request the same routes, mostly against unchanged tables.
+    # t0 is part of the key, so hits only happen within the same second; the
+    # cache is emptied once the version or the second moves on, and capped at
+    # PATH_CACHE_MAX in between. Failures are cached too. A view edited after
+    # take_snapshot() has no version.
+    version = view['version'] if view else reservations_version
+    if graph is not GRAPH or version is None:
+        return search_space_time(graph, start, end, t0, rid, max_time, view, via)
+    key = (start, end, via, t0, rid, max_time, version)
+    with path_cache_lock:
+        path = path_cache.get(key, False)
+    if path is not False:
+        return list(path) if path else None
+    path = search_space_time(graph, start, end, t0, rid, max_time, view, via)
+    with path_cache_lock:
+        if version == reservations_version and path_cache:
+            oldest = next(iter(path_cache))
+            if oldest[-1] != version or oldest[3] < t0 or len(path_cache) >= PATH_CACHE_MAX:
+                path_cache.clear()  # entries from older versions or seconds can never hit again
+        path_cache[key] = tuple(path) if path else None
+    return path
+
+def search_space_time(graph, start, end, t0, rid, max_time, view, via):
+    # The search runs on int node ids. A state packs (step, phase, node) into one int,
+    # (step * 2 + phase) * n + node with step = t - t0, so g_score/came_from hash small
+    # ints instead of tuples; names only come back for is_safe and the returned path.
+    # With via, phase 0 means via is still ahead and flips to 1 on reaching it, so a
+    # pickup -> drop job is one search ending at (end, phase 1) instead of two legs.
+    # The open list is a bucket queue: f -> [(g, node, step, phase), ...], popped from
+    # the lowest non-empty f (LIFO within a bucket), and the path is rebuilt from
+    # came_from at the goal. step is tracked on its own: g carries the wait penalty.
+    if graph is GRAPH:
+        names, ids, succ, dist = NODE_LIST, NODE_ID, NEIGHBORS_WITH_WAIT, DIST
+    else:
+        names, ids, succ = build_tables(graph)
+        dist = build_dist(succ)
+    s, e = ids.get(start), ids.get(end)
+    v = ids.get(via) if via is not None else -1
+    if s is None or e is None or v is None:
+        return None
+    n = len(names)
+    # h is the exact step count ignoring other robots: to end (phase 1), or to via
+    # then end (phase 0). Every move changes it by at most one step, so it is
+    # consistent, and None marks nodes the goal can't be reached from at all.
+    h_end = [row[e] * MOVE_COST if row[e] is not None else None for row in dist]
+    via_to_end = dist[v][e] if v >= 0 else 0
+    if via_to_end is None:
+        return None
+    h_via = [row[v] * MOVE_COST + via_to_end * MOVE_COST if v >= 0 and row[v] is not None else None
+             for row in dist]
+    h_table = (h_via, h_end)
+    phase = 0 if 0 <= v != s else 1
+    if h_table[phase][s] is None:
+        return None
+    start_state = phase * n + s
+    buckets = {0: [(0, s, 0, phase)]}
+    f = 0     # lowest f that may still hold entries
+    size = 1  # entries left across all buckets
+    came_from = {}              # state -> previous state
+    g_score = {start_state: 0}  # cheapest g seen per state
+    inf = float('inf')
+    res, idle = (view['reservations'], view['idle_at']) if view else (reservations, idle_at)
+    while size:
+        bucket = buckets.get(f)
+        if not bucket:
+            f += 1
             continue
-        neighbors = list(graph[curr].values()) + [curr]  # include wait
-        for nb in neighbors:
-            nt = current_time + 1
-            if (nb, nt) in visited:
+        g, curr, step, phase = bucket.pop()
+        size -= 1
+        state = (step * 2 + phase) * n + curr
+        if g > g_score[state]:
+            continue  # stale: a cheaper push of this state came later (lazy deletion)
+        if curr == e and phase:
+            return reconstruct_path(came_from, state, names)
+        if step >= max_time:
+            continue
+        # is_safe inlined: every neighbour is checked against the same time step
+        slot = res.get(t0 + step + 1, {})
+        base = (step + 1) * 2 * n
+        for nb in succ[curr]:  # includes wait
+            ng = g + (WAIT_COST if nb == curr else MOVE_COST)
+            nphase = 1 if phase or nb == v else 0
+            next_state = base + nphase * n + nb
+            if ng >= g_score.get(next_state, inf):
+                continue
+            h = h_table[nphase][nb]
+            if h is None:
                 continue
-            if is_safe(nb, nt, rid):
-                visited.add((nb, nt))
-                ng = g + 1
-                if nb == curr:
-                    ng += 1.1
-                h = get_manhattan_dist(nb, end)
-                heapq.heappush(open_set, (ng + h, ng, nb, path + [nb]))
+            name = names[nb]
+            owner = slot.get(name)
+            if owner and owner != rid:
+                continue
+            occupants = idle.get(name)
+            if occupants and (len(occupants) > 1 or rid not in occupants):
+                continue
+            g_score[next_state] = ng
+            came_from[next_state] = state
+            nf = ng + h
+            entry = (ng, nb, step + 1, nphase)
+            if nf in buckets:
+                buckets[nf].append(entry)
+            else:
+                buckets[nf] = [entry]
+            size += 1
     return None
 
+def reconstruct_path(came_from, state, names):
+    n = len(names)
+    path = [names[state % n]]
+    while state in came_from:
+        state = came_from[state]
+        path.append(names[state % n])
+    path.reverse()
+    return path
+
 def reserve_path_trajectory(path, t0, rid):
     # clear previous reservations for rid
-    keys = [k for k,v in reservations.items() if v == rid]
-    for k in keys:
-        del reservations[k]
+    release_reservations(rid)
+    held = robot_reservations[rid] = []
     for i, n in enumerate(path):
-        reservations[(n, t0 + i)] = rid
+        t = t0 + i
+        slot = reservations.get(t)
+        if slot is None:
+            slot = reservations[t] = {}
+            heapq.heappush(reservation_heap, t)
+        slot[n] = rid
+        held.append((n, t))
+    bump_reservations_version()
+
+def release_reservations(rid):
+    # O(robot's own path) instead of scanning every reservation in the system
+    held = robot_reservations.pop(rid, ())
+    for n, t in held:
+        slot = reservations.get(t)
+        if slot and slot.get(n) == rid:
+            del slot[n]
+    if held:
+        bump_reservations_version()
+
+def path_still_free(path, t0, rid):
+    return all(is_safe(n, t0 + i, rid) for i, n in enumerate(path) if i)
+
+def plan_job_path(start, pickup, drop, t0, rid, view=None):
+    # one search for start -> pickup -> drop; each leg used to get its own
+    # MAX_SEARCH_DEPTH budget, so the joint search gets both
+    return space_time_a_star(GRAPH, start, drop, t0, rid, 2 * MAX_SEARCH_DEPTH, view, via=pickup)
+
+def prune_reservations(cutoff):
+    # drops whole time steps off the heap: O(expired steps) per tick. Emptied
+    # steps are left in place until then, so each time is on the heap only once.
+    while reservation_heap and reservation_heap[0] < cutoff:
+        reservations.pop(heapq.heappop(reservation_heap), None)
 
 def find_nearest_parking(node):
-    candidates = []
-    for p in PARKING_NODES:
-        occupied = any(r.get('node')==p and r.get('status')=='idle' for r in robots.values())
-        if not occupied:
-            candidates.append((get_manhattan_dist(node,p), p))
-    if not candidates:
-        return None
-    candidates.sort()
-    return candidates[0][1]
+    # spots with an idle robot on them are taken; idle_at answers that per spot
+    nx, ny = NODE_COORDS.get(node, (0,0))
+    best = min(((abs(x-nx) + abs(y-ny), p) for p, x, y in PARKING_XY if p not in idle_at), default=None)
+    return best[1] if best else None
 
 # ---------------------------------------------------------
 # 4. Instruction generation helpers
 # ---------------------------------------------------------
-CLOCKWISE = {'n':'e','e':'s','s':'w','w':'n'}
-CCW = {v:k for k,v in CLOCKWISE.items()}
-OPP = {'n':'s','s':'n','e':'w','w':'e'}
-
-def direction_between(a,b):
-    for d, nb in GRAPH[a].items():
-        if nb == b:
-            return d
-    return None
+# Headings are ints 0..3 clockwise from north, so turning is arithmetic:
+# right (d+1)&3, left (d-1)&3, about-face d^2. Names only at the API boundary.
+DIR_CH = 'nesw'
+DIR_IDX = {c: i for i, c in enumerate(DIR_CH)}
+TURN_CMD = 'SRUL'  # command for a heading change of (target - cur) & 3
+
+def parse_dir(value, default):
+    # 'n'/'e'/'s'/'w' from a request to a heading; anything else gives default
+    return DIR_IDX.get(value.lower(), default) if isinstance(value, str) else default
 
-def instruction_from_dirs(cur, target):
-    if cur == target:
-        return 'S'
-    if CLOCKWISE[cur] == target:
-        return 'R'
-    if CCW[cur] == target:
-        return 'L'
-    if OPP[cur] == target:
-        return 'U'
-    return 'S'
+# (a, b) -> heading of the edge a->b
+EDGE_DIR = {(a, b): DIR_IDX[d] for a, nbrs in GRAPH.items() for d, b in nbrs.items()}
 
 def path_to_instr_list(path, initial_dir):
     instrs = []
     cur = initial_dir
     for i in range(len(path)-1):
-        a = path[i]; b = path[i+1]
-        target = direction_between(a,b)
-        if not target:
+        t = EDGE_DIR.get((path[i], path[i+1]))
+        if t is None:
+            # a wait, or nodes that aren't adjacent: sent as a U-turn
             instrs.append('U')
-            cur = OPP.get(cur, cur)
-            continue
-        cmd = instruction_from_dirs(cur, target)
-        instrs.append(cmd)
-        if cmd == 'R':
-            cur = CLOCKWISE[cur]
-        elif cmd == 'L':
-            cur = CCW[cur]
-        elif cmd == 'U':
-            cur = OPP[cur]
+            cur ^= 2
         else:
-            cur = cur
+            instrs.append(TURN_CMD[(t - cur) & 3])
+            cur = t
     return instrs, cur
 
 def apply_instrs_to_dir(initial_dir, instrs):
     cur = initial_dir
     for c in instrs:
         if c == 'R':
-            cur = CLOCKWISE.get(cur, cur)
+            cur = (cur + 1) & 3
         elif c == 'L':
-            cur = CCW.get(cur, cur)
+            cur = (cur - 1) & 3
         elif c == 'U':
-            cur = OPP.get(cur, cur)
+            cur ^= 2
     return cur
 
 def random_color():
@@ -212,39 +534,89 @@ def create_system_job(pickup, drop, rid):
 # ---------------------------------------------------------
 # 5. Allocator thread (keeps original behavior)
 # ---------------------------------------------------------
+def plan_pass(pending, idle, view, current_t):
+    # plans queued jobs against a snapshot, without state_lock; returns
+    # (job, rid, start_node, full_path) for commit under the lock
+    plans = []
+    for job in pending:
+        if not idle:
+            break
+        rid, start_node = idle[0]
+        full_path = plan_job_path(start_node, job['pickup'], job['drop'], current_t, rid, view)
+        if full_path:
+            # later jobs in this pass must see these slots taken and the robot busy
+            for i, n in enumerate(full_path):
+                view['reservations'].setdefault(current_t + i, {})[n] = rid
+            view['idle_at'].get(start_node, set()).discard(rid)
+            view['version'] = None  # no longer matches any live version; don't cache
+            idle.pop(0)
+            plans.append((job, rid, start_node, full_path))
+    return plans
+
 def allocator_loop():
+    global alloc_wanted
+    wait = ALLOC_IDLE_WAIT
     while True:
-        with state_lock:
+        with alloc_cv:
+            if not alloc_wanted:
+                alloc_cv.wait(timeout=wait)
+            alloc_wanted = False
+        with state_lock.write():
             current_t = int(time.time())
-            # cleanup old reservations
-            old = [k for k in reservations if k[1] < current_t]
-            for k in old: del reservations[k]
+            if reservation_heap and reservation_heap[0] < current_t:
+                prune_reservations(current_t)
             pending = [j for j in job_queue if j['status'] == 'queued']
-            for job in pending:
-                idle = [r for r, info in robots.items() if info.get('status') == 'idle']
-                if not idle:
-                    break
-                rid = idle[0]
-                start_node = robots[rid]['node']
-                path = space_time_a_star(GRAPH, start_node, job['pickup'], current_t, rid)
-                if path:
-                    arrival_t = current_t + len(path) - 1
-                    path2 = space_time_a_star(GRAPH, job['pickup'], job['drop'], arrival_t, rid)
-                    if path2:
-                        full_path = path + path2[1:]
-                        reserve_path_trajectory(full_path, current_t, rid)
-                        job['assigned_robot'] = rid
-                        job['status'] = 'assigned'
-                        job['path'] = full_path
-                        job_queue.remove(job)
-                        robots[rid]['status'] = 'busy'
-                        robots[rid]['current_job'] = job['id']
-                        robots[rid]['current_path'] = full_path
-                        socketio.emit('job_update', {'job': job})
-                        socketio.emit('robot_update', {'robot': rid, 'info': robots[rid]})
-        time.sleep(0.5)
-
-threading.Thread(target=allocator_loop, daemon=True).start()
+            idle = [(r, robot_node[r]) for r, st in robot_status.items() if st == 'idle']
+            view = take_snapshot() if pending and idle else None
+        # A* runs on the snapshot without state_lock; only the commit takes it
+        plans = plan_pass(pending, idle, view, current_t) if view else []
+        committed = 0
+        if plans:
+            with state_lock.write():
+                for job, rid, start_node, full_path in plans:
+                    # idle robots' status and node only change under state_lock,
+                    # so this check needs no robot lock; the writes below do
+                    if (job['status'] != 'queued' or job not in job_queue
+                            or robot_status.get(rid) != 'idle' or robot_node[rid] != start_node
+                            or not path_still_free(full_path, current_t, rid)):
+                        continue  # state moved on while planning; the job is retried next pass
+                    reserve_path_trajectory(full_path, current_t, rid)
+                    job['assigned_robot'] = rid
+                    job['status'] = 'assigned'
+                    job['path'] = full_path
+                    job_queue.remove(job)
+                    with robot_locks[rid]:
+                        robot_status[rid] = 'busy'
+                        robot_job[rid] = job['id']
+                        set_robot_path(rid, full_path)
+                        index_robot(rid)
+                        mark_job(job['id'])
+                        mark_robot(rid)
+                    committed += 1
+        # with idle robots still free, leftover jobs were blocked by reservations
+        # that only time clears, so poll for them; otherwise sleep until notified
+        wait = ALLOC_RETRY_WAIT if view and committed < min(len(pending), len(idle)) else ALLOC_IDLE_WAIT
+
+socketio.start_background_task(allocator_loop)
+
+def emitter_loop():
+    while True:
+        emit_wanted.wait()
+        time.sleep(EMIT_INTERVAL)  # let a burst of updates pile into one batch
+        emit_wanted.clear()
+        with dirty_lock:
+            rids, jids = list(dirty_robots), list(dirty_jobs)
+            dirty_robots.clear()
+            dirty_jobs.clear()
+        with state_lock.read():
+            batch = {'robots': {}, 'jobs': [dict(jobs[jid]) for jid in jids if jid in jobs]}
+            for rid in rids:
+                with robot_locks[rid]:
+                    batch['robots'][rid] = robot_view(rid)
+        if batch['robots'] or batch['jobs']:
+            socketio.emit('batch', batch)
+
+socketio.start_background_task(emitter_loop)
 
 # ---------------------------------------------------------
 # 6. HTTP API: request_path returns ONLY plan list + job_id
@@ -261,56 +633,59 @@ def request_path():
     data = request.json or {}
     rid = data.get('robot_id')
     node = data.get('node')
-    facing = (data.get('dir') or data.get('facing') or 's').lower()
+    facing = parse_dir(data.get('dir') or data.get('facing'), DIR_IDX['s'])
     pickup = data.get('pickup')
     drop = data.get('drop')
 
-    if not rid or rid not in robots:
+    if not rid or rid not in robot_locks:
         return jsonify({'error': 'unknown robot'}), 400
     if not node:
         return jsonify({'error': 'node missing'}), 400
     if not pickup or not drop:
         return jsonify({'error': 'pickup/drop missing'}), 400
 
-    with state_lock:
-        robots[rid]['node'] = node
-        robots[rid]['dir'] = facing
-        robots[rid]['last_seen'] = time.time()
-
+    with robot_write(rid):
+        robot_node[rid] = node
+        robot_dir[rid] = facing
+        robot_seen[rid] = time.time()
+        index_robot(rid)
         now = int(time.time())
-        path_to_pickup = space_time_a_star(GRAPH, node, pickup, now, rid)
-        if not path_to_pickup:
-            return jsonify({'error': 'no path to pickup'}), 500
-        arrive_t = now + len(path_to_pickup) - 1
-        path_pickup_to_drop = space_time_a_star(GRAPH, pickup, drop, arrive_t, rid)
-        if not path_pickup_to_drop:
-            return jsonify({'error': 'no path pickup->drop'}), 500
+        view = take_snapshot()
+
+    # A* runs on the snapshot without state_lock
+    full_path = plan_job_path(node, pickup, drop, now, rid, view)
+    if not full_path:
+        return jsonify({'error': 'no path via pickup to drop'}), 500
 
-        full_path = path_to_pickup + path_pickup_to_drop[1:]
+    with robot_write(rid):
+        if not path_still_free(full_path, now, rid):
+            # someone reserved into the path while we planned; replan on the live tables
+            full_path = plan_job_path(node, pickup, drop, now, rid)
+            if not full_path:
+                return jsonify({'error': 'no path via pickup to drop'}), 500
 
         reserve_path_trajectory(full_path, now, rid)
 
-        robots[rid]['status'] = 'busy'
-        robots[rid]['current_path'] = full_path
+        robot_status[rid] = 'busy'
+        set_robot_path(rid, full_path)
+        index_robot(rid)
 
         job = create_system_job(pickup, drop, rid)
         job['path'] = full_path
-        robots[rid]['current_job'] = job['id']
+        robot_job[rid] = job['id']
 
-        instr1, facing_after_pickup = path_to_instr_list(path_to_pickup, facing)
-        instr2, _ = path_to_instr_list(path_pickup_to_drop, facing_after_pickup)
-        # align instr2 so we don't duplicate the pickup edge
-        full_instr = instr1 + (instr2[1:] if len(instr2) > 0 else [])
+        # one instruction per edge of the whole route; facing carries through pickup
+        full_instr, _ = path_to_instr_list(full_path, facing)
 
         plan = []
         for i in range(len(full_path)-1):
             plan.append([ full_path[i], full_instr[i] ])
         plan.append([ full_path[-1], 'D' ])
 
-        socketio.emit('job_update', {'job': job})
-        socketio.emit('robot_update', {'robot': rid, 'info': robots[rid]})
+        mark_job(job['id'])
+        mark_robot(rid)
         print(plan)
-        return jsonify({'ok': True, 'plan': plan, 'job_id': job['id']}), 200
+        return json_response({'ok': True, 'plan': plan, 'job_id': job['id']})
 
 # ---------------------------------------------------------
 # rest of API: register, poll, update_location, report_execution, reset
@@ -320,13 +695,20 @@ def register_robot():
     data = request.json or {}
     rid = data.get('robot_id') or str(uuid.uuid4())[:6]
     node = data.get('node') or '81'
-    direction = (data.get('dir') or data.get('facing') or 's').lower()
+    direction = parse_dir(data.get('dir') or data.get('facing'), DIR_IDX['s'])
     color = random_color()
-    with state_lock:
-        if rid in robots:
-            color = robots[rid].get('color', color)
-        robots[rid] = {'status': 'idle', 'node': node, 'last_seen': time.time(), 'color': color, 'current_path': [], 'dir': direction}
-    socketio.emit('robot_update', {'robot': rid, 'info': robots[rid]})
+    with state_lock.write(), robot_locks.setdefault(rid, threading.Lock()):
+        color = robot_color.get(rid, color)
+        robot_status[rid] = 'idle'
+        robot_node[rid] = node
+        robot_seen[rid] = time.time()
+        robot_color[rid] = color
+        set_robot_path(rid, [])
+        robot_dir[rid] = direction
+        robot_job.pop(rid, None)
+        index_robot(rid)
+        mark_robot(rid)
+    wake_allocator()
     return jsonify({'robot_id': rid, 'color': color}), 200
 
 @app.route('/submit_job', methods=['POST'])
@@ -336,23 +718,41 @@ def submit_job():
         return jsonify({'error': 'req'}), 400
     job_id = str(uuid.uuid4())[:8]
     job = {'id': job_id, 'pickup': data['pickup'], 'drop': data['drop'], 'submitted_ts': time.time(), 'status': 'queued', 'assigned_robot': None}
-    with state_lock:
+    with state_lock.write():
         job_queue.append(job)
         jobs[job_id] = job
-    socketio.emit('job_update', {'job': job})
+        mark_job(job_id)
+    wake_allocator()
     return jsonify({'job_id': job_id}), 200
 
 @app.route('/poll_task', methods=['GET'])
 def poll_task():
     rid = request.args.get('robot_id')
-    with state_lock:
-        if rid not in robots:
-            return jsonify({'error': 'unknown'}), 400
-        robots[rid]['last_seen'] = time.time()
-        jid = robots[rid].get('current_job')
-        if jid:
-            return jsonify({'job': jobs.get(jid)}), 200
-        return jsonify({'job': None}), 200
+    lock = robot_locks.get(rid)
+    if lock is None:
+        return jsonify({'error': 'unknown'}), 400
+    with lock:
+        robot_seen[rid] = time.time()
+        # the body only changes with the robot's job, and every such change ends
+        # with mark_robot/mark_job dropping it under this same lock
+        body = poll_cache.get(rid)
+        if body is None:
+            jid = robot_job.get(rid)
+            body = poll_cache[rid] = json_dumps({'job': jobs.get(jid) if jid else None})
+    return json_response(body)
+
+def move_robot(rid, node, reported_dir):
+    # position part of update_location; call with rid's lock held
+    robot_node[rid] = node
+    robot_seen[rid] = time.time()
+    robot_dir[rid] = parse_dir(reported_dir, robot_dir[rid])
+    # advance along the path from where the robot last was: the next node
+    # normally, or a few further on if reports were missed
+    path, pos = robot_path[rid], robot_pos[rid]
+    for i in range(pos + 1, min(pos + 1 + PATH_SEEK_WINDOW, len(path))):
+        if path[i] == node:
+            robot_pos[rid] = i
+            break
 
 @app.route('/update_location', methods=['POST'])
 def update_location():
@@ -360,28 +760,29 @@ def update_location():
     rid = data.get('robot_id')
     node = data.get('node')
     status = data.get('status')
-    reported_dir = (data.get('dir') or data.get('facing') or None)
-    with state_lock:
-        if rid not in robots:
-            return jsonify({'error': 'unknown'}), 400
-        robots[rid]['node'] = node
-        robots[rid]['last_seen'] = time.time()
-        if reported_dir:
-            robots[rid]['dir'] = reported_dir.lower()
-        path = robots[rid].get('current_path', [])
-        if node in path:
-            robots[rid]['current_path'] = path[path.index(node):]
+    reported_dir = data.get('dir') or data.get('facing')
+    lock = robot_locks.get(rid)
+    if lock is None:
+        return jsonify({'error': 'unknown'}), 400
+    if status != 'job_done':
+        # heartbeat from a busy robot: nothing shared changes, so its own lock
+        # is enough. Idle robots are indexed in idle_at and take the slow path.
+        with lock:
+            if robot_status[rid] == 'busy':
+                move_robot(rid, node, reported_dir)
+                mark_robot(rid)
+                return json_response(OK_BODY)
+    with robot_write(rid):
+        move_robot(rid, node, reported_dir)
         if status == 'job_done':
-            jid = robots[rid].get('current_job')
+            jid = robot_job.get(rid)
             if jid and jid in jobs:
                 jobs[jid]['status'] = 'done'
-                socketio.emit('job_update', {'job': jobs[jid]})
-            robots[rid]['status'] = 'idle'
-            robots[rid]['current_path'] = []
-            robots[rid].pop('current_job', None)
-            keys = [k for k, v in reservations.items() if v == rid]
-            for k in keys:
-                del reservations[k]
+                mark_job(jid)
+            robot_status[rid] = 'idle'
+            set_robot_path(rid, [])
+            robot_job.pop(rid, None)
+            release_reservations(rid)
             if node not in PARKING_NODES:
                 parking_spot = find_nearest_parking(node)
                 if parking_spot:
@@ -390,14 +791,17 @@ def update_location():
                     park_path = space_time_a_star(GRAPH, node, parking_spot, current_t, rid)
                     if park_path:
                         reserve_path_trajectory(park_path, current_t, rid)
-                        robots[rid]['status'] = 'busy'
-                        robots[rid]['current_job'] = parking_job['id']
-                        robots[rid]['current_path'] = park_path
-                        socketio.emit('job_update', {'job': parking_job})
+                        robot_status[rid] = 'busy'
+                        robot_job[rid] = parking_job['id']
+                        set_robot_path(rid, park_path)
+                        mark_job(parking_job['id'])
                     else:
                         jobs[parking_job['id']]['status'] = 'failed'
-        socketio.emit('robot_update', {'robot': rid, 'info': robots[rid]})
-    return jsonify({'ok': True}), 200
+        index_robot(rid)
+        mark_robot(rid)
+        if robot_status[rid] == 'idle':
+            wake_allocator()
+    return json_response(OK_BODY)
 
 @app.route('/report_execution', methods=['POST'])
 def report_execution():
@@ -408,14 +812,15 @@ def report_execution():
     nodes = data.get('nodes_traversed', [])
     cmds = data.get('commands_executed', "")
 
-    if not rid or rid not in robots:
+    if not rid or rid not in robot_locks:
         return jsonify({'error': 'unknown'}), 400
 
-    with state_lock:
+    other = None
+    with robot_write(rid):
         if nodes_with_dir and isinstance(nodes_with_dir, list) and len(nodes_with_dir) > 0:
             last = nodes_with_dir[-1]
-            robots[rid]['node'] = last.get('node', robots[rid].get('node'))
-            robots[rid]['dir'] = (last.get('dir') or robots[rid].get('dir', 's')).lower()
+            robot_node[rid] = last.get('node', robot_node[rid])
+            robot_dir[rid] = parse_dir(last.get('dir'), robot_dir[rid])
             report = {'nodes_with_dir': nodes_with_dir, 'ts': time.time()}
         else:
             if isinstance(cmds, str):
@@ -423,51 +828,57 @@ def report_execution():
             else:
                 cmd_list = list(cmds or [])
             if nodes:
-                robots[rid]['node'] = nodes[-1]
-            cur = robots[rid].get('dir', 's')
-            for c in cmd_list:
-                if c == 'R':
-                    cur = CLOCKWISE.get(cur, cur)
-                elif c == 'L':
-                    cur = CCW.get(cur, cur)
-                elif c == 'U':
-                    cur = OPP.get(cur, cur)
-            robots[rid]['dir'] = cur
+                robot_node[rid] = nodes[-1]
+            robot_dir[rid] = apply_instrs_to_dir(robot_dir[rid], cmd_list)
             report = {'nodes': nodes, 'cmds': cmd_list, 'ts': time.time()}
 
         if jid and jid in jobs:
             jobs[jid].setdefault('reports', []).append({'robot': rid, **report})
             jobs[jid]['status'] = 'done'
-
-        robots[rid]['status'] = 'idle'
-        robots[rid]['current_path'] = []
-        robots[rid].pop('current_job', None)
-        keys = [k for k, v in reservations.items() if v == rid]
-        for k in keys:
-            del reservations[k]
-
-        socketio.emit('robot_update', {'robot': rid, 'info': robots[rid]})
+            mark_job(jid)
+            other = jobs[jid].get('assigned_robot')
+
+        robot_status[rid] = 'idle'
+        set_robot_path(rid, [])
+        robot_job.pop(rid, None)
+        release_reservations(rid)
+        index_robot(rid)
+        mark_robot(rid)
+    if other and other != rid and other in robot_locks:
+        # the closed job belonged to another robot; drop its poll body under its lock
+        with robot_locks[other]:
+            mark_robot(other)
+    wake_allocator()
     return jsonify({'ok': True}), 200
 
 @app.route('/reset_sim', methods=['POST'])
 def reset_sim():
-    with state_lock:
+    with state_lock.write():
         job_queue.clear()
         reservations.clear()
+        robot_reservations.clear()
+        reservation_heap.clear()
+        bump_reservations_version()
         for j in jobs.values():
             if j['status'] == 'assigned':
                 j['status'] = 'failed'
-                socketio.emit('job_update', {'job': j})
-        for r in robots.values():
-            r['status'] = 'idle'
-            r['current_path'] = []
-            r.pop('current_job', None)
-            socketio.emit('robot_update', {'robot': r.get('id', 'unknown'), 'info': r})
+                mark_job(j['id'])
+        for rid in robot_status:
+            with robot_locks[rid]:
+                robot_status[rid] = 'idle'
+                set_robot_path(rid, [])
+                robot_job.pop(rid, None)
+                index_robot(rid)
+                mark_robot(rid)
     return jsonify({'ok': True}), 200
 
 @socketio.on('connect')
 def on_connect():
-    with state_lock:
+    with state_lock.read():
+        robots = {}
+        for rid in list(robot_status):
+            with robot_locks[rid]:
+                robots[rid] = robot_view(rid)
         socketio.emit('layout', {'nodes': NODE_COORDS, 'graph': GRAPH})
         socketio.emit('state_snapshot', {'robots': robots, 'jobs': list(jobs.values())})
 
@@ -571,8 +982,11 @@ let isDragging = false, startDrag = { x: 0, y: 0 };
 socket.on('connect', () => console.log('Connected'));
 socket.on('layout', d => { NODE_COORDS = d.nodes; GRAPH_DATA = d.graph; drawMap(); });
 socket.on('state_snapshot', d => { ROBOTS = d.robots||{}; JOBS={}; (d.jobs||[]).forEach(j=>JOBS[j.id]=j); updateUI(); });
-socket.on('robot_update', d => { ROBOTS[d.robot] = d.info; updateUI(); });
-socket.on('job_update', d => { JOBS[d.job.id] = d.job; updateUI(); });
+socket.on('batch', d => {
+    Object.assign(ROBOTS, d.robots||{});
+    (d.jobs||[]).forEach(j=>JOBS[j.id]=j);
+    updateUI();
+});
 
 function updateUI() {
     document.getElementById('stat-robots').innerText = Object.keys(ROBOTS).length;